@@ -1,145 +1,374 @@
-"""methods used for communicating with the Judge0 compiler"""
+"""methods used for running code on the compiler, through the execution
+backends"""
 # standard library imports
-from typing import List, Union, Tuple, Set
+from contextlib import aclosing
+from typing import (
+    AsyncIterator, Awaitable, Callable, Iterable, Iterator, List, Union, Tuple,
+    Set,
+)
 import time
 import asyncio
+import logging
+import random
 
 # external library imports
-import requests
-import aiohttp
+import numpy as np
 
 # internal imports
-from app.helpers import input_generator
+from app.helpers import (
+    execution_backends, input_generator, metrics, sample_store, timing_harness,
+)
 from app.models import website_data
 import app.settings as settings
 
-def get_active_languages() -> Union[List[dict], None]:
-    endpoint = settings.COMPILER_BASE_URL+'/languages'
-    result = requests.get(endpoint)
-    if result.status_code == 200:
-        # remove the entries that aren't programming languages
-        lang_list = [
-            i for i in result.json() if i['name'].lower() not in [
-                'executable', 'plain text']
-        ]
-        return lang_list
-    else:
+async def get_active_languages() -> Union[List[dict], None]:
+    # languages of the healthy execution backends
+    if (languages := await execution_backends.get_pool().get_languages()) \
+            is None:
         return None
+    # remove the entries that aren't programming languages
+    lang_list = [
+        i for i in languages if i['name'].lower() not in [
+            'executable', 'plain text']
+    ]
+    return lang_list
 
 def generate_inputs_for_code(
     data: website_data.CodeSubmissions,
-) -> Union[List, None]:
-    # returns all generated input cases
+) -> Union[Iterator, None]:
+    # returns all generated input cases lazily, each repeated
+    # data.repetitions times; fewer distinct inputs are generated when
+    # repeating
+    num_inputs = settings.MAX_INPUTS // data.repetitions
     if data.input_type == 0:    # string
-        return input_generator.generate_string_inputs(
+        input_list = input_generator.iter_string_inputs(
             str_info=data.string_details,
-            num_inputs=settings.MAX_INPUTS,
+            num_inputs=num_inputs,
         )
     elif data.input_type == 1:  # number
-        return input_generator.generate_number_inputs(
+        input_list = input_generator.generate_number_inputs(
             num_info=data.number_details,
-            num_inputs=settings.MAX_INPUTS,
+            num_inputs=num_inputs,
         )
     else:
         return None
+    return repeat_inputs(input_list, data.repetitions)
 
-async def create_submission(
-    code: str, language_id: str, code_input: str,
-    session: aiohttp.ClientSession
-) -> Union[str, None]:
-    # creates a single submission in the compiler
-    endpoint = settings.COMPILER_BASE_URL+'/submissions?'\
-        f'base64_encoded=false&wait=false'
-
-    request_body = {
-        "source_code": code,
-        "language_id": language_id,
-        "stdin": code_input,
-        "encoded": "false"
-    }
-    async with session.post(endpoint, json=request_body) as resp:
-        result = await resp.json()
-        if 'token' in result:
-            return result['token']
-        return None
+def get_input_sizes_for_code(
+    data: website_data.CodeSubmissions,
+) -> Union[List, None]:
+    # the sizes of the distinct inputs generate_inputs_for_code makes, for
+    # callers that generate them a few at a time with
+    # input_generator.generate_inputs_for_sizes
+    num_inputs = settings.MAX_INPUTS // data.repetitions
+    if data.input_type == 0:    # string
+        return list(input_generator.get_string_input_lengths(
+            str_info=data.string_details,
+            num_inputs=num_inputs,
+        ))
+    elif data.input_type == 1:  # number
+        return input_generator.generate_number_inputs(
+            num_info=data.number_details,
+            num_inputs=num_inputs,
+        )
+    return None
 
-async def get_submission_tokens_dict(
-    code: str, language_id: str, input_list: List[str]
-) -> dict:
-    submission_tokens_dict = {}
+def repeat_inputs(input_list: Iterable, repetitions: int) -> Iterator:
+    # the runs of one input are sent in the same batch
+    for inp in input_list:
+        for _ in range(repetitions):
+            yield inp
+
+def chunk_list(items: List, chunk_size: int) -> List[List]:
+    # splits items into consecutive chunks of at most chunk_size items
+    return [
+        items[i:i+chunk_size] for i in range(0, len(items), chunk_size)
+    ]
+
+async def submit_inputs(
+    code: str, language_id: str, input_list: Iterable, input_type: int,
+    store: Union[sample_store.SampleStore, None] = None,
+    harness: bool = False, repetitions: int = 1,
+) -> sample_store.SampleStore:
+    # submits every input and adds the accepted submissions to the store
+    # (a new one by default) by token, with the size of their input
+    # input_list may be a lazy iterator; each batch is submitted as soon as
+    # it is full, while the next inputs are still being generated, and is
+    # released once judge0 has it, only its sizes are kept
+    # with harness, the code runs in a timing harness that runs up to
+    # HARNESS_INPUTS_PER_RUN inputs per submission
+    # input_list holds the repeated runs of each input one after the other
+    # (see repeat_inputs); batches end between inputs so that the runs of
+    # an input are sent together
+    # when generating or submitting fails or is cancelled part way, the
+    # submissions already created are released before raising
+    store = sample_store.SampleStore() if store is None else store
+    batch_size = max(
+        repetitions,
+        settings.SUBMISSION_BATCH_SIZE//repetitions*repetitions,
+    )
+    if harness:
+        code = timing_harness.wrap(code, language_id)
     tasks = []
-    async with aiohttp.ClientSession() as session:
-        for inp in input_list:
-            tasks.append(
-                asyncio.ensure_future(
-                    create_submission(
-                        code=code,
-                        language_id=language_id,
-                        code_input=inp,
-                        session=session,
-                    )
+
+    async def submit(input_batch: List) -> List[Tuple[List, Union[str, None]]]:
+        # sizes of the inputs of each submission, with its token
+        sizes = [
+            input_generator.get_input_size(inp, input_type)
+            for inp in input_batch
+        ]
+        if harness:
+            run_sizes = chunk_list(sizes, settings.HARNESS_INPUTS_PER_RUN)
+            code_inputs = [
+                timing_harness.encode_inputs(inputs) for inputs in chunk_list(
+                    input_batch, settings.HARNESS_INPUTS_PER_RUN
                 )
-            )
+            ]
+        else:
+            run_sizes = [[size] for size in sizes]
+            code_inputs = input_batch
+        tokens = await execution_backends.get_pool().submit(
+            code=code,
+            language_id=language_id,
+            code_inputs=code_inputs,
+        )
+        return list(zip(run_sizes, tokens))
+
+    input_batch = []
+    with metrics.stage_timer('submission'):
+        try:
+            for inp in metrics.timed_iterator('generate_inputs', input_list):
+                input_batch.append(inp)
+                if len(input_batch) == batch_size:
+                    tasks.append(asyncio.ensure_future(submit(input_batch)))
+                    input_batch = []
+                    # let the submitted batch start before generating the
+                    # next one
+                    await asyncio.sleep(0)
+            if input_batch:
+                tasks.append(asyncio.ensure_future(submit(input_batch)))
+            del input_batch
 
-        submissions_list = await asyncio.gather(*tasks)
-        for i, token in enumerate(submissions_list):
+            batches = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            execution_backends.get_pool().release([
+                token for task in tasks
+                if not task.cancelled() and task.exception() is None
+                for _, token in task.result() if token
+            ])
+            raise
+    for batch in batches:
+        for sizes, token in batch:
             if token:
-                submission_tokens_dict[token] = input_list[i]
-    return submission_tokens_dict
-
-async def get_submission_result(
-    token: str, session: aiohttp.ClientSession
-) -> Tuple[bool, Union[float, None]]:
-    # gets the result of a created submission using the token
-    endpoint = settings.COMPILER_BASE_URL+'/submissions/'+token
-    
-    async with session.get(endpoint) as result:
-        if result.status == 200:
-            res_json = await result.json()
-            # check the status
-            if res_json['status']['id'] in [1, 2]:
-                await asyncio.sleep(1)
-                return await get_submission_result(token, session)
-            elif res_json['status']['id'] == 3:
-                # successfully ran and accepted
-                return (True, float(res_json['time']))
-            elif res_json['status']['id'] == 5:
-                # time limit exceeded
-                return (False, res_json['message'])
-            else:
-                # runtime error occured
-                return (False, res_json['stderr'])
-        else:
-            # error occurred in the request
-            raise Exception(
-                f'error occurred while fetching submission result:\n{result.text}'
+                store.add_runs(token, sizes, harnessed=harness)
+    return store
+
+async def iter_submission_results(
+    tokens: List[str], deadline: Union[float, None] = None,
+) -> AsyncIterator[dict]:
+    # polls all outstanding tokens together, backing off exponentially with
+    # jitter between rounds, and yields the results that finished in each
+    # round, as (is_success, runtime or error, status id) by token; stops at
+    # the deadline (event loop time) or when the consumer stops iterating,
+    # and then lets the backends drop the submissions left unfinished
+    loop = asyncio.get_running_loop()
+    if deadline is None:
+        deadline = loop.time() + settings.RESULT_DEADLINE
+    in_flight = asyncio.Semaphore(settings.MAX_POLLS_IN_FLIGHT)
+    pool = execution_backends.get_pool()
+
+    async def poll_batch(token_batch: List[str]) -> dict:
+        async with in_flight:
+            return await pool.get_results(token_batch)
+
+    pending_tokens = list(tokens)
+    delay = settings.POLL_INITIAL_DELAY
+    # time spent polling, leaving out the time the consumer holds a yield
+    elapsed = 0.0
+    started = time.perf_counter()
+    try:
+        while pending_tokens:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            jitter = random.uniform(
+                1-settings.POLL_JITTER, 1+settings.POLL_JITTER
             )
+            await asyncio.sleep(min(delay*jitter, remaining))
+            delay = min(
+                delay*settings.POLL_BACKOFF_FACTOR, settings.POLL_MAX_DELAY
+            )
+            metrics.POLL_ROUNDS.inc()
 
-async def get_runtimes_from_tokens(
-    tokens_dict: dict
-) -> Union[Tuple[bool, List[str]], Tuple[bool, Set[str]]]:
-    runtime_list = []
-    error_set = set()
-    tasks = []
-    code_input = []
-    async with aiohttp.ClientSession() as session:
-        for token in tokens_dict:
-            code_input.append(tokens_dict[token])
-            tasks.append(
-                asyncio.ensure_future(
-                    get_submission_result(token, session)
+            polls = [
+                asyncio.ensure_future(poll_batch(batch)) for batch in chunk_list(
+                    pending_tokens, settings.SUBMISSION_BATCH_SIZE
                 )
+            ]
+            try:
+                done, timed_out = await asyncio.wait(
+                    polls, timeout=max(deadline - loop.time(), 0),
+                )
+            finally:
+                for poll in polls:
+                    poll.cancel()
+            # the batches that came back before the deadline still count
+            finished = {}
+            for poll in polls:
+                if poll in done:
+                    finished.update(poll.result())
+            pending_tokens = [i for i in pending_tokens if i not in finished]
+            if finished:
+                elapsed += time.perf_counter() - started
+                started = None
+                yield finished
+                started = time.perf_counter()
+            if timed_out:
+                break
+    finally:
+        if started is not None:
+            elapsed += time.perf_counter() - started
+        metrics.record_stage('polling', elapsed)
+        pool.release(pending_tokens)
+
+    if pending_tokens:
+        logging.warning(
+            f'deadline reached with {len(pending_tokens)} of {len(tokens)} '
+            'submissions unfinished'
+        )
+
+async def collect_submission_results(
+    tokens: List[str], deadline: Union[float, None] = None,
+) -> dict:
+    # returns whatever results were collected by the deadline
+    results = {}
+    async with aclosing(iter_submission_results(tokens, deadline)) as polled:
+        async for finished in polled:
+            results.update(finished)
+    return results
+
+def record_results(store: sample_store.SampleStore, finished: dict) -> List:
+    # records finished results in the store and returns the new
+    # [size, runtime] pairs of the successful ones
+    new_runtimes = []
+    for token, (status, output, status_id, log) in finished.items():
+        if not status:
+            store.record(token, status_id, error=output)
+            continue
+        sizes = store.sizes_of(token)
+        if token in store.harnessed:
+            # the runtimes the harness measured replace the process' time
+            output = timing_harness.parse_timings(log)
+            if len(output) != len(sizes):
+                store.record(
+                    token, execution_backends.INTERNAL_ERROR,
+                    error=f'the timing harness reported {len(output)} of '
+                    f'{len(sizes)} runtimes',
+                )
+                continue
+        store.record(token, status_id, runtime=output)
+        new_runtimes.extend(
+            [size, runtime] for size, runtime in zip(
+                sizes, output if isinstance(output, list) else [output]
             )
+        )
+    return new_runtimes
 
-        submission_results = await asyncio.gather(*tasks)
-        for i, (status, output) in enumerate(submission_results):
-            if status:
-                runtime_list.append([code_input[i], output])
-            else:
-                error_set.add(output)
+def get_repeated_failure(
+    store: sample_store.SampleStore,
+) -> Union[str, None]:
+    # the error a program keeps failing with, once it has failed with it
+    # EARLY_ABORT_REPEATED_ERRORS times and more often than it succeeded
+    if not store.failures:
+        return None
+    error, count = store.failures.most_common(1)[0]
+    if count >= settings.EARLY_ABORT_REPEATED_ERRORS and \
+            count > store.count(sample_store.ACCEPTED):
+        return error
+    return None
 
-    if len(runtime_list) >= len(tokens_dict)//2:
+def shrink_to_time_limit(
+    store: sample_store.SampleStore,
+) -> Union[Tuple[np.ndarray, np.ndarray], None]:
+    # sizes and runtimes of the successful runs below the smallest size that
+    # exceeded the time limit, when enough of them ran successfully to fit
+    # the models on that shorter range; None otherwise
+    timed_out = store.sizes_with(sample_store.TIME_LIMIT_EXCEEDED)
+    if not timed_out.size:
+        return None
+    cutoff = timed_out.min()
+    sizes, runtimes = store.successful()
+    below = sizes < cutoff
+    submitted_below = np.count_nonzero(
+        np.frombuffer(store.sizes, dtype=np.float64) < cutoff
+    )
+    if np.unique(sizes[below]).size < settings.SHRUNK_RANGE_MIN_SIZES or \
+            np.count_nonzero(below) < submitted_below//2:
+        return None
+    return sizes[below], runtimes[below]
+
+async def get_runtimes_from_tokens(
+    store: sample_store.SampleStore,
+    on_progress: Union[Callable[[List], Awaitable[None]], None] = None,
+) -> Union[
+    Tuple[bool, Tuple[np.ndarray, np.ndarray]], Tuple[bool, Set[str]]
+]:
+    # polls the pending submissions in the store and records their results
+    # returns (False, (sizes, runtimes)) of the successful runs or
+    # (True, errors) when fewer than half of them succeeded
+    # when the runs keep failing with the same error, the results still
+    # outstanding are not waited for; when the largest inputs exceeded the
+    # time limit, the range is cut below them instead of failing
+    # on_progress is awaited with the [size, runtime] pairs of every
+    # polling round that finished some submissions successfully
+    async with aclosing(iter_submission_results(
+        store.pending_tokens
+    )) as results:
+        async for finished in results:
+            new_runtimes = record_results(store, finished)
+            if (error := get_repeated_failure(store)) is not None:
+                metrics.EARLY_ABORTS.inc(reason='repeated_error')
+                return True, {error}
+            if on_progress and new_runtimes:
+                await on_progress(new_runtimes)
+    if store.count(sample_store.PENDING):
+        # still running when the deadline was reached
+        store.errors.add('timed out waiting for the compiler')
+
+    if store.count(sample_store.ACCEPTED) >= len(store)//2:
         # ignore errors if at least half of the inputs ran successfully
-        return False, runtime_list
+        return False, store.successful()
+    if (shrunk := shrink_to_time_limit(store)) is not None:
+        metrics.RANGES_SHRUNK.inc()
+        return False, shrunk
     # otherwise return errors
-    return True, error_set
+    return True, store.errors
+
+async def run_canary(
+    data: website_data.CodeSubmissions,
+) -> Union[Tuple[bool, sample_store.SampleStore], Tuple[bool, Set[str]]]:
+    # runs the code once on the smallest input before anything else is
+    # submitted, so that code which doesn't compile or can't run at all
+    # costs a single execution
+    # returns (True, errors) when that run failed, else (False, store) with
+    # the run in it, to be kept as a sample
+    low = input_generator.get_input_size_range(data)[0]
+    if not (store := await submit_inputs(
+        code=data.code,
+        language_id=data.language_id,
+        input_list=input_generator.generate_inputs_for_sizes(data, [low]),
+        input_type=data.input_type,
+    )):
+        raise Exception('empty submission tokens dict returned')
+    async with aclosing(iter_submission_results(store.tokens)) as results:
+        async for finished in results:
+            record_results(store, finished)
+    if store.count(sample_store.ACCEPTED):
+        return False, store
+    if store.count(sample_store.PENDING):
+        store.errors.add('timed out waiting for the compiler')
+    metrics.EARLY_ABORTS.inc(reason='canary')
+    return True, store.errors
@@ -1,34 +1,176 @@
 # standard library imports
-from typing import List
+from functools import cached_property
+from typing import Callable, Dict, List, Sequence, Tuple, Union
 
 # external library imports
 import numpy as np
 
-def constant_model(x: List, a: float) -> np.array:
-    # y = 0(x) + a
-    return np.zeros(len(x)) + a
+# largest power of 2 that is still a finite float64
+MAX_EXPONENT = np.log2(np.finfo(np.float64).max) - 1
 
-def logarithmic_model(x: List, a: float, b: float) -> np.array:
-    # y = a(logx) + b
-    x = np.array(x)
-    x[x==0] = 1 # replace 0 by 1 since log(0) is inf
-    return (a*np.log(x)) + b
+def _safe_log(x: np.ndarray) -> np.ndarray:
+    # replace 0 by 1 since log(0) is inf
+    return np.log(np.where(x==0, 1, x))
 
-def linear_model(x: List, a: float, b: float) -> np.array:
-    # y = a(x) + b
-    return (a*np.array(x))+b
+def exponential_model(x: List, a: float, b: float) -> np.array:
+    # y = 2^(ax + b)
+    # evaluated from its log: the exponent is capped so that large x gives
+    # a large finite value instead of overflowing to inf; x is taken as a
+    # float64 array, which np.asarray passes through without copying
+    x = np.asarray(x, dtype=np.float64)
+    return np.exp2(np.minimum((a*x)+b, MAX_EXPONENT))
 
-def quasilinear_model(x: List, a: float, b: float) -> np.array:
-    # y = a(x)(logx) + b
-    x = np.array(x)
-    return (a*x*x) + b
 
-def quadratic_model(x: List, a: float, b: float, c: float) -> np.array:
-    # y = a(x)(x) + b(x) + c
-    x = np.array(x)
-    return (a*x*x) + (b*x) + c
+class Basis:
+    """the columns the models are built from, for one array of input sizes;
+    each is computed on first use and shared by every model after that"""
 
-def exponential_model(x: List, a: float, b: float) -> np.array:
-    # y = 2^(ax + b)
-    x = np.array(x)
-    return 2**((a*x)+b)
+    def __init__(self, x: Union[List[float], np.ndarray]) -> None:
+        self.x = np.asarray(x, dtype=np.float64)
+
+    @classmethod
+    def of(cls, x: Union['Basis', List[float], np.ndarray]) -> 'Basis':
+        return x if isinstance(x, cls) else cls(x)
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    @cached_property
+    def ones(self) -> np.ndarray:
+        return np.ones_like(self.x)
+
+    @cached_property
+    def log(self) -> np.ndarray:
+        return _safe_log(self.x)
+
+    @cached_property
+    def sqrt(self) -> np.ndarray:
+        return np.sqrt(np.abs(self.x))
+
+    @cached_property
+    def x_log(self) -> np.ndarray:
+        return self.x*self.log
+
+    @cached_property
+    def x_log_squared(self) -> np.ndarray:
+        return self.x_log*self.log
+
+    @cached_property
+    def squared(self) -> np.ndarray:
+        return self.x*self.x
+
+    @cached_property
+    def cubed(self) -> np.ndarray:
+        return self.squared*self.x
+
+
+class ComplexityModel:
+    """a complexity class and how to fit it
+
+    models that are linear in their parameters declare the Basis columns the
+    parameters multiply and are solved in closed form; the others declare an
+    evaluator, bounds and a starting point and are fitted iteratively"""
+
+    def __init__(
+        self, name: str, key: str, num_params: int,
+        basis: Union[Callable[[Basis], List[np.ndarray]], None] = None,
+        evaluator: Union[Callable[..., np.ndarray], None] = None,
+        bounds: Tuple = (-np.inf, np.inf),
+        initial_guess: Union[
+            Callable[[np.ndarray, np.ndarray], Sequence[float]], None
+        ] = None,
+    ) -> None:
+        if (basis is None) == (evaluator is None):
+            raise ValueError('a model needs exactly one of basis and evaluator')
+        self.name = name
+        self.key = key  # field of the fitted parameters in the response
+        self.num_params = num_params
+        self.basis = basis
+        self.evaluator = evaluator
+        self.bounds = bounds
+        self.initial_guess = initial_guess
+
+    @property
+    def is_linear(self) -> bool:
+        return self.basis is not None
+
+    def design_matrix(
+        self, x: Union[Basis, List[float], np.ndarray],
+    ) -> np.ndarray:
+        # (num_points, num_params) matrix of the basis columns
+        return np.stack(self.basis(Basis.of(x)), axis=1)
+
+    def evaluate(
+        self, x: Union[Basis, List[float], np.ndarray],
+        params: Sequence[float],
+    ) -> np.ndarray:
+        basis = Basis.of(x)
+        if self.is_linear:
+            return self.design_matrix(basis) @ np.asarray(
+                params, dtype=np.float64
+            )
+        return self.evaluator(basis.x, *params)
+
+
+def _exponential_guess(x: np.ndarray, y: np.ndarray) -> List[float]:
+    # log2(y) = ax + b is linear, so the positive runtimes are fitted in log
+    # space by least squares; an error of e on y is an error of about e/y on
+    # log(y), hence the rows are scaled by y, which keeps the small, noisy
+    # runtimes from pulling the guess away from the large ones
+    positive = y > 0
+    if np.unique(x[positive]).size < 2:
+        return [0, 0]
+    x, y = x[positive], y[positive]
+    design = np.stack([x, np.ones_like(x)], axis=1)*y[:, None]
+    params, *_ = np.linalg.lstsq(design, np.log2(y)*y, rcond=None)
+    return params.tolist()
+
+
+# registered models by name, in order of increasing growth; the order breaks
+# ties in favour of the simpler model
+MODELS: Dict[str, ComplexityModel] = {}
+
+
+def register_model(model: ComplexityModel) -> None:
+    MODELS[model.name] = model
+
+
+for model in [
+    ComplexityModel(
+        'Constant', 'constant_model', 1,
+        basis=lambda b: [b.ones],
+    ),
+    ComplexityModel(
+        'Logarithmic', 'log_model', 2,
+        basis=lambda b: [b.log, b.ones],
+    ),
+    ComplexityModel(
+        'Square root', 'sqrt_model', 2,
+        basis=lambda b: [b.sqrt, b.ones],
+    ),
+    ComplexityModel(
+        'Linear', 'linear_model', 2,
+        basis=lambda b: [b.x, b.ones],
+    ),
+    ComplexityModel(
+        'Quasilinear', 'quasi_model', 2,
+        basis=lambda b: [b.x_log, b.ones],
+    ),
+    ComplexityModel(
+        'Log-squared linear', 'log_squared_linear_model', 2,
+        basis=lambda b: [b.x_log_squared, b.ones],
+    ),
+    ComplexityModel(
+        'Quadratic', 'quadratic_model', 3,
+        basis=lambda b: [b.squared, b.x, b.ones],
+    ),
+    ComplexityModel(
+        'Cubic', 'cubic_model', 4,
+        basis=lambda b: [b.cubed, b.squared, b.x, b.ones],
+    ),
+    ComplexityModel(
+        'Exponential', 'exponential_model', 2,
+        evaluator=exponential_model, initial_guess=_exponential_guess,
+    ),
+]:
+    register_model(model)
@@ -12,7 +12,7 @@ def catchall_exceptions(func):
             return func(*args, **kwargs)
         except Exception as e:
             unpacked_kwargs = {**kwargs}
-            notifs.send_message_on_discord(
+            notifs.notify_threadsafe(
                 f'error occured in `{func.__name__}`\nerror trace: {e}'
                 f'\nargs: {[*args]}\nkwargs: {unpacked_kwargs}'
             )
@@ -28,7 +28,7 @@ def async_catchall_exceptions(func):
             return await func(*args, **kwargs)
         except Exception as e:
             unpacked_kwargs = {**kwargs}
-            notifs.send_message_on_discord(
+            notifs.notify(
                 f'error occured in `{func.__name__}`\nerror trace: {e}'
                 f'\nargs: {[*args]}\nkwargs: {unpacked_kwargs}'
             )
@@ -1,186 +1,164 @@
 # standard library imports
 import json
-from typing import List, Tuple
-import logging
+from typing import List, Tuple, Union
 
 # external library imports
-import scipy
 import numpy as np
+import scipy.stats
 
 # internal imports
-from app.helpers import complexity_models
+from app.helpers import (
+    complexity_models, fitting_engine, input_generator, model_selection
+)
 import app.settings as settings
 
 def get_standard_error(
-    outputs_of_model: np.array, actual_runtimes: List[float]
+    outputs_of_model: np.array, actual_runtimes: List[float],
+    weights: Union[List[float], None] = None,
 ) -> List[float]:
-    diff = outputs_of_model - actual_runtimes
-    return np.std(diff)/np.sqrt(len(diff))
+    # outputs_of_model can hold one model output per row
+    diff = outputs_of_model - np.asarray(actual_runtimes)
+    if weights is None:
+        return np.std(diff, axis=-1)/np.sqrt(diff.shape[-1])
+    # weighted standard deviation of the residuals
+    weights = np.asarray(weights)/np.sum(weights)
+    mean = np.sum(weights*diff, axis=-1, keepdims=True)
+    weighted_std = np.sqrt(np.sum(weights*(diff-mean)**2, axis=-1))
+    return weighted_std/np.sqrt(diff.shape[-1])
 
-def min_max_normalise(data: List[float]) -> List[float]:
-    data = np.array(data)
-    min_nax_norm = (data-data.min()) / (data.max()-data.min()+0.00001)
-    return min_nax_norm.tolist()
+def min_max_normalise(data: List[float]) -> np.ndarray:
+    data = np.asarray(data, dtype=np.float64)
+    return (data-data.min()) / (data.max()-data.min()+0.00001)
 
-def prepare_data_for_complexity_estimation(
-    input_and_time_list: List[Tuple[str, str]],
-    input_type: str,
-) -> Tuple[List[int], List[float]]:
-    if input_type == settings.STRING_INPUT_CODE:
-        x_data = [len(i[0]) for i in input_and_time_list]
-    else:
-        x_data = [i[0] for i in input_and_time_list]
-    runtime_list = [i[1] for i in input_and_time_list]
-    normalised_runtime_list = min_max_normalise(runtime_list)
-    return x_data, normalised_runtime_list
-
-def get_complexity_estimates(
-    input_and_time_list: List[Tuple[str, str]],
-    input_type: str,
-) -> json:
-    x_data, runtime_list = prepare_data_for_complexity_estimation(
-        input_and_time_list, input_type
+def aggregate_repeated_runtimes(
+    sizes: np.ndarray, runtimes: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # groups repeated runs of the same input size and returns the sizes in
+    # increasing order, their aggregated runtimes, the dispersion of the
+    # runs and the number of runs, as float64 arrays (int for the counts)
+    unique_sizes, group, counts = np.unique(
+        np.asarray(sizes, dtype=np.float64), return_inverse=True,
+        return_counts=True,
     )
-    # get the arguments for each model that fit the curve best
-    #constant model
-    try:
-        constant_args, _ = scipy.optimize.curve_fit(
-            f=complexity_models.constant_model, method="lm", xdata=x_data,
-            ydata=runtime_list, p0=[0]
-        )
-    except RuntimeError as e:
-        if 'Optimal parameters not found' in e.args[0]:
-            logging.debug(
-                f'constant parameters not found for points. Error trace: {e} '
-                f'x_data={x_data}\nruntime_list={runtime_list}'
-            )
-            constant_args = [runtime_list[0]]
-        else:
-            raise RuntimeError(e)
+    sorted_runtimes = np.asarray(runtimes, dtype=np.float64)[
+        np.argsort(group, kind='stable')
+    ]
+    starts = np.cumsum(counts) - counts
 
-    constant_output = complexity_models.constant_model(x_data, *constant_args)
-    constant_error = get_standard_error(constant_output, runtime_list)
-    
-    #logarithmic model
-    try:
-        log_args, _ = scipy.optimize.curve_fit(
-            f=complexity_models.logarithmic_model, method="lm", xdata=x_data,
-            ydata=runtime_list, p0=[0,0]
-        )
-    except RuntimeError as e:
-        if 'Optimal parameters not found' in e.args[0]:
-            logging.debug(
-                f'log parameters not found for points. Error trace: {e} '
-                f'x_data={x_data}\nruntime_list={runtime_list}'
+    aggregated = np.empty(len(unique_sizes))
+    dispersions = np.empty(len(unique_sizes))
+    # sizes with the same number of runs are aggregated together, as the
+    # rows of a (sizes, runs) matrix
+    for count in np.unique(counts):
+        sizes_with_count = np.flatnonzero(counts == count)
+        runs = sorted_runtimes[
+            starts[sizes_with_count, None] + np.arange(count)
+        ]
+        if settings.RUNTIME_AGGREGATION == 'trimmed_mean':
+            trimmed = scipy.stats.trimboth(
+                runs, settings.RUNTIME_TRIM_FRACTION, axis=1
             )
-            log_args = [runtime_list[0],runtime_list[0]]
+            aggregated[sizes_with_count] = np.mean(trimmed, axis=1)
+            dispersions[sizes_with_count] = np.std(trimmed, axis=1)
         else:
-            raise RuntimeError(e)
-
-    logarithmic_output = complexity_models.logarithmic_model(x_data, *log_args)
-    logarithmic_error = get_standard_error(logarithmic_output, runtime_list)
-    
-    #linear model
-    try:
-        linear_args, _ = scipy.optimize.curve_fit(
-            f=complexity_models.linear_model, method="lm", xdata=x_data,
-            ydata=runtime_list, p0=[0,0]
-        )
-    except RuntimeError as e:
-        if 'Optimal parameters not found' in e.args[0]:
-            logging.debug(
-                f'linear parameters not found for points. Error trace: {e} '
-                f'x_data={x_data}\nruntime_list={runtime_list}'
+            # median with the scaled median absolute deviation
+            median = np.median(runs, axis=1)
+            aggregated[sizes_with_count] = median
+            dispersions[sizes_with_count] = 1.4826*np.median(
+                np.abs(runs-median[:, None]), axis=1
             )
-            linear_args = [runtime_list[0],runtime_list[0]]
-        else:
-            raise RuntimeError(e)
+    return unique_sizes, aggregated, dispersions, counts
 
-    linear_output = complexity_models.linear_model(x_data, *linear_args)
-    linear_error = get_standard_error(linear_output, runtime_list)
-    
-    #quasilinear model
-    try:
-        quasi_args, _ = scipy.optimize.curve_fit(
-            f=complexity_models.quasilinear_model, method="lm", xdata=x_data,
-            ydata=runtime_list, p0=[0,0]
-        )
-    except RuntimeError as e:
-        if 'Optimal parameters not found' in e.args[0]:
-            logging.debug(
-                f'quasi parameters not found for points. Error trace: {e} '
-                f'x_data={x_data}\nruntime_list={runtime_list}'
-            )
-            quasi_args = [runtime_list[0],runtime_list[0]]
-        else:
-            raise RuntimeError(e)
+def get_inverse_variance_weights(
+    dispersions: np.ndarray, counts: np.ndarray,
+) -> Union[np.ndarray, None]:
+    # weights of the aggregated runtimes, None when every input ran once
+    if max(counts) == 1:
+        return None
+    # the timer's resolution bounds how small the dispersion can really be
+    dispersions = np.maximum(dispersions, settings.RUNTIME_RESOLUTION)
+    variances = dispersions**2/np.asarray(counts)
+    return 1/variances
 
-    quasilinear_output = complexity_models.quasilinear_model(
-        x_data, *quasi_args
+def fit_models(
+    x_data: List[float], runtime_list: List[float],
+    weights: Union[List[float], None] = None,
+    fallbacks: Union[List[str], None] = None,
+) -> Tuple[dict, np.ndarray]:
+    # fits every registered model; returns the fitted arguments keyed by
+    # complexity name and the standard error of each model in the same order
+    # the names of the models whose fit didn't converge are added to
+    # fallbacks
+    # the linear-in-parameters models are solved together in closed form
+    model_args, linear_outputs = fitting_engine.fit_linear_models(
+        x_data, runtime_list, weights
     )
-    quasilinear_error = get_standard_error(quasilinear_output, runtime_list)
-    
-    #quadratic model
-    try:
-        quadratic_args, _ = scipy.optimize.curve_fit(
-            f=complexity_models.quadratic_model, method="lm", xdata=x_data,
-            ydata=runtime_list, p0=[0,0,0]
-        )
-    except RuntimeError as e:
-        if 'Optimal parameters not found' in e.args[0]:
-            logging.debug(
-                f'quadratic parameters not found for points. Error trace: {e} '
-                f'x_data={x_data}\nruntime_list={runtime_list}'
+    outputs = dict(zip(model_args, linear_outputs))
+    for name, model in complexity_models.MODELS.items():
+        if not model.is_linear:
+            model_args[name], converged = fitting_engine.fit_nonlinear_model(
+                model, x_data, runtime_list, weights
             )
-            quadratic_args = [runtime_list[0],runtime_list[0],runtime_list[0]]
-        else:
-            raise RuntimeError(e)
-
-    quadratic_output = complexity_models.quadratic_model(
-        x_data, *quadratic_args
+            if not converged and fallbacks is not None:
+                fallbacks.append(name)
+            outputs[name] = model.evaluate(x_data, model_args[name])
+    model_args = {name: model_args[name] for name in complexity_models.MODELS}
+    error_list = get_standard_error(
+        np.vstack([outputs[name] for name in model_args]), runtime_list, weights
     )
-    quadratic_error = get_standard_error(quadratic_output, runtime_list)
-    
-    #exponential model
-    try:
-        exponential_args, _ = scipy.optimize.curve_fit(
-            f=complexity_models.exponential_model, method="lm", xdata=x_data,
-            ydata=runtime_list, p0=[0,0]
-        )
-    except RuntimeError as e:
-        if 'Optimal parameters not found' in e.args[0]:
-            logging.debug(
-                f'exponential parameters not found for points. Error trace: {e} '
-                f'x_data={x_data}\nruntime_list={runtime_list}'
-            )
-            exponential_args = [runtime_list[0],runtime_list[0]]
-        else:
-            raise RuntimeError(e)
+    return model_args, error_list
+
+def select_model(
+    x_data: List[float], runtime_list: List[float], model_args: dict,
+    weights: Union[List[float], None] = None,
+) -> List[dict]:
+    # the models ranked by MODEL_SELECTION_CRITERION, best first, with their
+    # scores and relative likelihoods
+    return model_selection.rank_models(model_selection.score_models(
+        x_data, runtime_list, model_args, weights
+    ))
 
-    exponential_output = complexity_models.exponential_model(
-        x_data, *exponential_args
+def get_complexity_estimates(
+    input_and_time_list: List[Tuple[str, str]],
+    input_type: str,
+) -> json:
+    # estimates from [input, runtime] pairs
+    sizes = [
+        input_generator.get_input_size(inp, input_type)
+        for inp, _ in input_and_time_list
+    ]
+    runtimes = [float(runtime) for _, runtime in input_and_time_list]
+    return estimate_from_samples(sizes, runtimes)
+
+def estimate_from_samples(sizes: np.ndarray, runtimes: np.ndarray) -> json:
+    # repeated runs of a size are aggregated into one robust runtime; the
+    # arrays are float64 from here on, so the fits and scores below use them
+    # without converting or copying
+    x_data, runtimes, dispersions, counts = aggregate_repeated_runtimes(
+        sizes, runtimes
+    )
+    runtime_list = min_max_normalise(runtimes)
+    weights = get_inverse_variance_weights(dispersions, counts)
+    # get the arguments for each model that fit the curve best
+    fallbacks = []
+    model_args, error_list = fit_models(
+        x_data, runtime_list, weights, fallbacks
     )
-    exponential_error = get_standard_error(exponential_output, runtime_list)
-    
+
     # get the name of the least complexity model
-    complexity_list = [
-        "Constant", "Logarithmic", "Linear", "Quasilinear",
-        "Quadratic", "Exponential"
-    ]
-    error_list = np.array([
-        constant_error, logarithmic_error, linear_error, quasilinear_error,
-        quadratic_error, exponential_error
-    ])
-    index_of_lowest_error = np.argmin(error_list)
-    best_fitting_model = complexity_list[index_of_lowest_error]
-    
+    complexity_list = list(complexity_models.MODELS)
+    ranking = select_model(x_data, runtime_list, model_args, weights)
+
     return {
-        'estimated_complexity': best_fitting_model,
-        'runtime_list': list(runtime_list),
-        'constant_model': list(constant_args),
-        'linear_model': list(linear_args),
-        'log_model': list(log_args),
-        'quasi_model': list(quasi_args),
-        'quadratic_model': list(quadratic_args),
-        'exponential_model': list(exponential_args)
+        'estimated_complexity': ranking[0]['model'],
+        'runtime_list': runtime_list.tolist(),
+        'runtime_dispersion': dispersions.tolist(),
+        'runs_per_input': counts.tolist(),
+        **{
+            model.key: model_args[name]
+            for name, model in complexity_models.MODELS.items()
+        },
+        'model_errors': dict(zip(complexity_list, error_list.tolist())),
+        'model_ranking': ranking,
+        'fit_fallbacks': fallbacks,
     }
@@ -0,0 +1,154 @@
+"""streams provisional complexity estimates as server-sent events while the
+submissions finish"""
+# standard library imports
+from contextlib import aclosing
+from typing import AsyncIterator, List
+import json
+import math
+
+# internal imports
+from app.helpers import (
+    code_compiler, estimate_complexity, fitting_pool, input_generator,
+    metrics, notifs, result_cache, sample_store,
+)
+from app.models import website_data
+import app.settings as settings
+
+
+def format_event(event: str, data) -> str:
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def split_into_waves(
+    sizes: List, wave_size: int, repetitions: int = 1,
+) -> List[List]:
+    # interleaves the input sizes so that every wave spans the whole size
+    # range; a wave holds about wave_size runs, repetitions per size
+    num_waves = max(1, math.ceil(len(sizes)*repetitions/wave_size))
+    return [sizes[i::num_waves] for i in range(num_waves)]
+
+
+def rank_models(model_ranking: List[dict]) -> List[str]:
+    return [i['model'] for i in model_ranking]
+
+
+def get_confidence(
+    model_ranking: List[dict], completed: int, total: int,
+) -> float:
+    # weight of the best model among all models, scaled by the share of the
+    # inputs that have run so far
+    return round(model_ranking[0]['weight']*completed/total, 4)
+
+
+async def stream_estimates(
+    data: website_data.CodeSubmissions, sizes: List, cache_key: str,
+) -> AsyncIterator[str]:
+    # submits the inputs wave by wave and re-fits the models whenever new
+    # runtimes arrive; stops submitting once the ranking of the leading
+    # models has been stable for a while
+    # waves interleave the input sizes; the inputs of a wave are generated
+    # just before it is submitted, so at most one wave of them is held
+    waves = split_into_waves(sizes, settings.STREAM_WAVE_SIZE, data.repetitions)
+    samples = sample_store.SampleStore()
+    completed = 0
+    total = len(sizes)*data.repetitions
+    estimates = previous_ranking = None
+    stable_updates = 0
+    stopped_early = False
+    try:
+        if settings.CANARY_ENABLED:
+            is_error, canary = await code_compiler.run_canary(data)
+            if is_error:
+                yield format_event('error', {'error': list(canary)})
+                return
+            samples = canary
+            completed += len(samples)
+            total += len(samples)
+
+        for wave in waves:
+            submitted = len(samples)
+            with metrics.stage_timer('generate_inputs'):
+                input_list = input_generator.generate_inputs_for_sizes(
+                    data, wave
+                )
+            await code_compiler.submit_inputs(
+                code=data.code, language_id=data.language_id,
+                input_list=code_compiler.repeat_inputs(
+                    input_list, data.repetitions
+                ),
+                input_type=data.input_type, store=samples,
+                repetitions=data.repetitions,
+            )
+            del input_list
+            if len(samples) == submitted:
+                raise Exception('empty submission tokens dict returned')
+
+            async with aclosing(code_compiler.iter_submission_results(
+                samples.tokens[submitted:]
+            )) as results:
+                async for finished in results:
+                    code_compiler.record_results(samples, finished)
+                    completed += len(finished)
+                    if (error := code_compiler.get_repeated_failure(
+                        samples
+                    )) is not None:
+                        metrics.EARLY_ABORTS.inc(reason='repeated_error')
+                        yield format_event('error', {'error': [error]})
+                        return
+                    if samples.count(sample_store.ACCEPTED) < \
+                            settings.STREAM_MIN_POINTS:
+                        continue
+
+                    estimates = await fitting_pool.run(
+                        estimate_complexity.estimate_from_samples,
+                        *samples.successful(),
+                    )
+                    ranking = rank_models(estimates['model_ranking'])
+                    ranking = ranking[:settings.STREAM_RANKED_MODELS]
+                    if ranking == previous_ranking:
+                        stable_updates += 1
+                    else:
+                        stable_updates = 0
+                    previous_ranking = ranking
+                    yield format_event('progress', {
+                        'completed': completed,
+                        'total': total,
+                        'estimated_complexity': estimates['estimated_complexity'],
+                        'confidence': get_confidence(
+                            estimates['model_ranking'], completed, total
+                        ),
+                        'ranking': ranking,
+                    })
+                    if stable_updates >= settings.STREAM_STABLE_UPDATES and \
+                            settings.STREAM_MIN_FRACTION*total <= completed < total:
+                        stopped_early = True
+                        break
+
+            succeeded = samples.count(sample_store.ACCEPTED)
+            if not succeeded or succeeded < len(samples)//2:
+                # same rule as the non-streaming endpoint: most inputs failed
+                yield format_event('error', {'error': list(samples.errors)})
+                return
+            if stopped_early:
+                break
+
+        if estimates is None:
+            # too few inputs for a provisional estimate
+            estimates = await fitting_pool.run(
+                estimate_complexity.estimate_from_samples, *samples.successful()
+            )
+        metrics.record_fit_fallbacks(estimates)
+        # the same body as pipeline.run_estimation's, since a request to
+        # /estimate_complexity without a harness shares the cache key
+        estimates = {**estimates, 'timing_harness': False}
+        if not stopped_early:
+            await result_cache.cache.set(cache_key, estimates)
+        yield format_event('result', {
+            **estimates, 'cache_hit': False, 'stopped_early': stopped_early,
+        })
+    except Exception as e:
+        notifs.notify(
+            f'error occured in `stream_estimates`\nerror trace: {e}'
+            f'\ndata: {data}'
+        )
+        yield format_event('error', {'error': [str(e)]})
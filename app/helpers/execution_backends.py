@@ -0,0 +1,601 @@
+"""backends that run the submitted code: judge0 instances and a local runner
+for python, behind a pool that routes each batch of submissions to the least
+loaded healthy backend
+
+tokens handed out by the pool are prefixed with the name of the backend that
+owns them, so results are fetched from the right one"""
+# standard library imports
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Set, Tuple, Union
+import asyncio
+import hashlib
+import logging
+import os
+import platform
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import uuid
+
+# external library imports
+import aiohttp
+
+# internal imports
+from app.helpers import http_client, metrics
+import app.settings as settings
+
+# (is_success, runtime or error, judge0 status id, stderr of the run)
+Result = Tuple[bool, Union[float, str], int, Union[str, None]]
+
+TOKEN_SEPARATOR = ':'
+# judge0 status ids the local runner reports
+ACCEPTED, TIME_LIMIT_EXCEEDED, RUNTIME_ERROR, INTERNAL_ERROR = 3, 5, 11, 13
+
+
+class BackendError(Exception):
+    """raised when a backend can't be reached or fails to take submissions"""
+
+
+def parse_submission_result(
+    res_json: dict
+) -> Union[Tuple[bool, Union[float, str]], None]:
+    # returns None while the submission is still in queue or processing
+    if res_json['status']['id'] in [1, 2]:
+        return None
+    elif res_json['status']['id'] == 3:
+        # successfully ran and accepted
+        return (True, float(res_json['time']))
+    elif res_json['status']['id'] == 5:
+        # time limit exceeded
+        return (
+            False,
+            res_json['message'] or res_json['status'].get('description'),
+        )
+    elif res_json['status']['id'] == 6:
+        # compilation error
+        return (False, res_json.get('compile_output') or 'compilation error')
+    else:
+        # runtime error occured
+        return (
+            False,
+            res_json['stderr'] or res_json['message']
+            or res_json['status'].get('description'),
+        )
+
+
+class ExecutionBackend(ABC):
+    """runs submissions and reports their results by token
+
+    the pool keeps in owned the tokens of the submissions it handed to the
+    backend whose results haven't been collected or released yet, and in
+    reserved the number of submissions it is handing over; outstanding
+    counts both, and relative to capacity it is the backend's load"""
+
+    def __init__(self, name: str, capacity: int) -> None:
+        self.name = name
+        self.capacity = capacity
+        self.owned: Set[str] = set()
+        self.reserved = 0
+        self.healthy = True
+        # None when any language is accepted
+        self.language_ids: Union[Set[int], None] = None
+
+    @property
+    def outstanding(self) -> int:
+        return len(self.owned) + self.reserved
+
+    def has_room(self, submissions: int) -> bool:
+        return self.outstanding + submissions <= self.capacity
+
+    @property
+    def load(self) -> float:
+        return self.outstanding/self.capacity
+
+    def supports(self, language_id: int) -> bool:
+        return self.language_ids is None or \
+            int(language_id) in self.language_ids
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    async def check_health(self) -> bool:
+        pass
+
+    @abstractmethod
+    async def get_languages(self) -> Union[List[dict], None]:
+        pass
+
+    @abstractmethod
+    async def create_submissions(
+        self, code: str, language_id: int, code_inputs: List,
+    ) -> List[Union[str, None]]:
+        # one token per input, None for rejected inputs; raises BackendError
+        # when the backend is unavailable
+        pass
+
+    @abstractmethod
+    async def get_results(self, tokens: List[str]) -> Dict[str, Result]:
+        # results of the finished submissions among tokens; raises
+        # BackendError when the backend is unavailable
+        pass
+
+    def release(self, tokens: List[str]) -> None:
+        # results of these submissions won't be asked for anymore
+        pass
+
+    def stats(self) -> dict:
+        return {
+            'name': self.name, 'healthy': self.healthy,
+            'outstanding': self.outstanding, 'capacity': self.capacity,
+        }
+
+
+class Judge0Backend(ExecutionBackend):
+    """one judge0 instance, through its batch api"""
+
+    def __init__(self, name: str, base_url: str, capacity: int) -> None:
+        super().__init__(name, capacity)
+        self.base_url = base_url.rstrip('/')
+
+    async def get_languages(self) -> Union[List[dict], None]:
+        async with http_client.get_session().get(
+            self.base_url+'/languages'
+        ) as result:
+            if result.status != 200:
+                return None
+            return await result.json()
+
+    async def check_health(self) -> bool:
+        # also learns which languages the instance runs
+        try:
+            languages = await self.get_languages()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            languages = None
+        if languages is not None:
+            self.language_ids = {i['id'] for i in languages}
+        return languages is not None
+
+    async def create_submissions(
+        self, code: str, language_id: int, code_inputs: List,
+    ) -> List[Union[str, None]]:
+        endpoint = self.base_url+'/submissions/batch?base64_encoded=false'
+        request_body = {
+            "submissions": [
+                {
+                    "source_code": code,
+                    "language_id": language_id,
+                    "stdin": code_input,
+                } for code_input in code_inputs
+            ]
+        }
+        try:
+            async with http_client.get_session().post(
+                endpoint, json=request_body
+            ) as resp:
+                if resp.status >= 500:
+                    raise BackendError(
+                        f'{self.name} answered {resp.status}: '
+                        f'{await resp.text()}'
+                    )
+                result = await resp.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise BackendError(f'{self.name} is unreachable: {e!r}') from e
+        if not isinstance(result, list):
+            # the whole batch was rejected
+            return [None]*len(code_inputs)
+        # rejected submissions come back without a token
+        return [item.get('token') for item in result]
+
+    async def get_results(self, tokens: List[str]) -> Dict[str, Result]:
+        endpoint = self.base_url+'/submissions/batch?'\
+            'base64_encoded=false&fields=token,status,time,stderr,message,'\
+            f'compile_output&tokens={",".join(tokens)}'
+
+        metrics.POLL_REQUESTS.inc()
+        try:
+            async with http_client.get_session().get(endpoint) as result:
+                if result.status != 200:
+                    # error occurred in the request
+                    raise BackendError(
+                        f'{self.name} failed to return submission results:\n'
+                        f'{await result.text()}'
+                    )
+                res_json = await result.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise BackendError(f'{self.name} is unreachable: {e!r}') from e
+
+        results = {}
+        for submission in res_json['submissions']:
+            metrics.JUDGE0_STATUSES.inc(status=submission['status']['id'])
+            if (parsed_result := parse_submission_result(submission)) \
+                    is not None:
+                results[submission['token']] = (
+                    *parsed_result, submission['status']['id'],
+                    submission['stderr'],
+                )
+        return results
+
+
+# run with `python -I -c LAUNCHER cpu_seconds memory_bytes file_bytes path`:
+# sets the resource limits in the child itself, since a preexec_fn isn't
+# safe in a process running threads, then runs the program as __main__ and
+# reports its errors without the launcher's frames
+LAUNCHER = """
+import resource, runpy, sys, traceback
+cpu, memory, files = map(int, sys.argv[1:4])
+resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+resource.setrlimit(resource.RLIMIT_FSIZE, (files, files))
+path = sys.argv[4]
+sys.argv = [path]
+try:
+    runpy.run_path(path, run_name='__main__')
+except SystemExit:
+    raise
+except BaseException as e:
+    tb = e.__traceback__
+    while tb is not None and tb.tb_frame.f_code.co_filename != path:
+        tb = tb.tb_next
+    traceback.print_exception(type(e), e, tb or e.__traceback__)
+    sys.exit(1)
+"""
+
+
+class LocalPythonBackend(ExecutionBackend):
+    """runs python code in subprocesses of this machine, with limits on cpu
+    time, memory and file size; results are reported with judge0's status
+    ids and the runtime is the wall time of the process, startup included,
+    like judge0's
+
+    meant for development and tests, the code isn't sandboxed beyond the
+    resource limits"""
+
+    def __init__(
+        self, name: str, workers: int, time_limit: float, memory_limit: int,
+        language_ids: Iterable[int],
+    ) -> None:
+        super().__init__(name, workers)
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        self.language_ids = set(language_ids)
+        self._slots = asyncio.Semaphore(workers)
+        self._runs: Dict[str, asyncio.Task] = {}
+        self._directory: Union[str, None] = None
+
+    async def start(self) -> None:
+        self._directory = tempfile.mkdtemp(prefix='local-runner-')
+
+    async def stop(self) -> None:
+        self.release(list(self._runs))
+        await asyncio.gather(*self._runs.values(), return_exceptions=True)
+        self._runs.clear()
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+        self._directory = None
+
+    async def check_health(self) -> bool:
+        return self._directory is not None
+
+    async def get_languages(self) -> Union[List[dict], None]:
+        return [
+            {'id': i, 'name': f'Python ({platform.python_version()})'}
+            for i in sorted(self.language_ids)
+        ]
+
+    def _write_program(self, code: str) -> str:
+        # one file per distinct program, shared by its submissions
+        path = os.path.join(
+            self._directory,
+            hashlib.sha256(code.encode()).hexdigest() + '.py',
+        )
+        if not os.path.exists(path):
+            with open(path, 'w') as file:
+                file.write(code)
+        return path
+
+    async def _run(self, path: str, stdin: str) -> Result:
+        async with self._slots:
+            started = time.perf_counter()
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, '-I', '-c', LAUNCHER,
+                str(int(self.time_limit) + 1), str(self.memory_limit),
+                str(settings.LOCAL_RUNNER_FILE_LIMIT), path,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=self._directory,
+                env={'PATH': os.environ.get('PATH', '')},
+                start_new_session=True,
+            )
+            try:
+                _, stderr = await asyncio.wait_for(
+                    process.communicate(stdin.encode()),
+                    timeout=2*self.time_limit,
+                )
+            except asyncio.TimeoutError:
+                # sleeping or blocked: over the wall time limit
+                process.kill()
+                await process.wait()
+                return (
+                    False, 'Time limit exceeded', TIME_LIMIT_EXCEEDED, None
+                )
+            except asyncio.CancelledError:
+                process.kill()
+                await process.wait()
+                raise
+            elapsed = time.perf_counter() - started
+
+        stderr = stderr.decode(errors='replace')[
+            -settings.LOCAL_RUNNER_STDERR_CHARS:
+        ]
+        if process.returncode == 0:
+            if elapsed > self.time_limit:
+                return (
+                    False, 'Time limit exceeded', TIME_LIMIT_EXCEEDED, stderr
+                )
+            return True, elapsed, ACCEPTED, stderr
+        if process.returncode in (-signal.SIGXCPU, -signal.SIGKILL):
+            # the cpu limit was reached
+            return False, 'Time limit exceeded', TIME_LIMIT_EXCEEDED, stderr
+        return (
+            False, stderr or f'exited with code {process.returncode}',
+            RUNTIME_ERROR, stderr,
+        )
+
+    async def create_submissions(
+        self, code: str, language_id: int, code_inputs: List,
+    ) -> List[Union[str, None]]:
+        if self._directory is None:
+            raise BackendError(f'{self.name} has not been started')
+        if not self.supports(language_id):
+            return [None]*len(code_inputs)
+        path = self._write_program(code)
+        tokens = []
+        for code_input in code_inputs:
+            token = uuid.uuid4().hex
+            self._runs[token] = asyncio.create_task(
+                self._run(path, str(code_input))
+            )
+            tokens.append(token)
+        return tokens
+
+    async def get_results(self, tokens: List[str]) -> Dict[str, Result]:
+        results = {}
+        for token in tokens:
+            if (run := self._runs.get(token)) is None:
+                results[token] = (
+                    False, 'unknown submission', INTERNAL_ERROR, None
+                )
+            elif run.done():
+                del self._runs[token]
+                try:
+                    results[token] = run.result()
+                except Exception as e:
+                    logging.error(f'local run failed: {e!r}')
+                    results[token] = (False, str(e), INTERNAL_ERROR, None)
+            else:
+                continue
+            metrics.JUDGE0_STATUSES.inc(status=results[token][2])
+        return results
+
+    def release(self, tokens: List[str]) -> None:
+        # kills the runs that are no longer waited for
+        for token in tokens:
+            if (run := self._runs.pop(token, None)) is not None:
+                run.cancel()
+
+
+class BackendPool:
+    """spreads submissions over backends: each batch goes to the least
+    loaded healthy backend that runs its language and has room for it, and
+    moves on to the next one if that backend fails; backends are health
+    checked in the background and left out while they are down
+
+    a batch is reserved on its backend before it is sent, so the batches an
+    estimate sends at once see each other's load; when no backend has room,
+    batches still go to the least loaded one and wait in its queue, so the
+    backends fill up in proportion to their capacity"""
+
+    def __init__(self, backends: List[ExecutionBackend]) -> None:
+        self.backends = {backend.name: backend for backend in backends}
+        self._health_task: Union[asyncio.Task, None] = None
+
+    async def check_health(self) -> None:
+        backends = list(self.backends.values())
+        results = await asyncio.gather(
+            *(backend.check_health() for backend in backends),
+            return_exceptions=True,
+        )
+        for backend, healthy in zip(backends, results):
+            healthy = healthy is True
+            if backend.healthy and not healthy:
+                logging.warning(f'execution backend {backend.name} is down')
+            backend.healthy = healthy
+
+    async def _check_health_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(settings.BACKEND_HEALTH_CHECK_INTERVAL)
+            await self.check_health()
+
+    async def start(self) -> None:
+        for backend in self.backends.values():
+            await backend.start()
+        await self.check_health()
+        self._health_task = asyncio.create_task(
+            self._check_health_periodically()
+        )
+
+    async def stop(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+        self._health_task = None
+        for backend in self.backends.values():
+            await backend.stop()
+
+    def candidates(
+        self, language_id: int, submissions: int = 1,
+    ) -> List[ExecutionBackend]:
+        # backends running the language, healthy ones first, then those with
+        # room for the submissions, least loaded first; backends that are
+        # down are still tried as a last resort
+        return sorted(
+            (i for i in self.backends.values() if i.supports(language_id)),
+            key=lambda i: (not i.healthy, not i.has_room(submissions), i.load),
+        )
+
+    async def submit(
+        self, code: str, language_id: int, code_inputs: List,
+    ) -> List[Union[str, None]]:
+        # creates one submission per input on a single backend and returns
+        # the pool's tokens in the same order as code_inputs
+        for backend in self.candidates(language_id, len(code_inputs)):
+            backend.reserved += len(code_inputs)
+            try:
+                tokens = await backend.create_submissions(
+                    code, language_id, code_inputs
+                )
+            except BackendError as e:
+                logging.error(str(e))
+                backend.healthy = False
+                metrics.BACKEND_FAILOVERS.inc(backend=backend.name)
+                continue
+            finally:
+                backend.reserved -= len(code_inputs)
+            created = [token for token in tokens if token]
+            backend.owned.update(created)
+            metrics.SUBMISSIONS_CREATED.inc(len(created))
+            metrics.SUBMISSIONS_REJECTED.inc(len(tokens) - len(created))
+            return [
+                f'{backend.name}{TOKEN_SEPARATOR}{token}' if token else None
+                for token in tokens
+            ]
+        metrics.SUBMISSIONS_REJECTED.inc(len(code_inputs))
+        return [None]*len(code_inputs)
+
+    def _group_by_backend(
+        self, tokens: List[str],
+    ) -> Dict[str, List[str]]:
+        groups: Dict[str, List[str]] = {}
+        for token in tokens:
+            name, _, backend_token = token.partition(TOKEN_SEPARATOR)
+            groups.setdefault(name, []).append(backend_token)
+        return groups
+
+    async def _get_backend_results(
+        self, backend: ExecutionBackend, tokens: List[str],
+    ) -> Dict[str, Result]:
+        # a backend that fails is marked down and its submissions are
+        # polled again next time, the other backends' results are kept
+        try:
+            return await backend.get_results(tokens)
+        except Exception as e:
+            logging.error(f'polling {backend.name} failed: {e!r}')
+            backend.healthy = False
+            metrics.BACKEND_FAILOVERS.inc(backend=backend.name)
+            return {}
+
+    async def get_results(self, tokens: List[str]) -> Dict[str, Result]:
+        # results of the finished submissions among tokens, keyed by the
+        # pool's tokens
+        groups = self._group_by_backend(tokens)
+        results = {}
+        unknown = [name for name in groups if name not in self.backends]
+        for name in unknown:
+            for token in groups.pop(name):
+                results[f'{name}{TOKEN_SEPARATOR}{token}'] = (
+                    False, 'unknown execution backend', INTERNAL_ERROR, None
+                )
+        names = list(groups)
+        backend_results = await asyncio.gather(*(
+            self._get_backend_results(self.backends[name], groups[name])
+            for name in names
+        ))
+        for name, finished in zip(names, backend_results):
+            # results the backend made up for tokens it never had, like
+            # 'unknown submission', don't count
+            self.backends[name].owned.difference_update(finished)
+            for token, result in finished.items():
+                results[f'{name}{TOKEN_SEPARATOR}{token}'] = result
+        return results
+
+    def release(self, tokens: List[str]) -> None:
+        # the results of these unfinished submissions won't be asked for
+        for name, backend_tokens in self._group_by_backend(tokens).items():
+            if (backend := self.backends.get(name)) is not None:
+                backend.owned.difference_update(backend_tokens)
+                backend.release(backend_tokens)
+
+    async def get_languages(self) -> Union[List[dict], None]:
+        # the languages of all healthy backends, each listed once
+        languages: Dict[int, dict] = {}
+        for backend in self.backends.values():
+            if not backend.healthy:
+                continue
+            try:
+                backend_languages = await backend.get_languages()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                continue
+            for language in backend_languages or []:
+                languages.setdefault(language['id'], language)
+        return list(languages.values()) or None
+
+    def stats(self) -> List[dict]:
+        return [backend.stats() for backend in self.backends.values()]
+
+
+def create_backends() -> List[ExecutionBackend]:
+    backends: List[ExecutionBackend] = []
+    for kind in settings.EXECUTION_BACKENDS:
+        if kind == 'judge0':
+            urls = settings.COMPILER_URLS or [settings.COMPILER_BASE_URL]
+            backends.extend(
+                Judge0Backend(
+                    f'judge0-{i}', url, settings.JUDGE0_BACKEND_CAPACITY
+                ) for i, url in enumerate(urls)
+            )
+        elif kind == 'local':
+            backends.append(LocalPythonBackend(
+                'local',
+                workers=settings.LOCAL_RUNNER_WORKERS,
+                time_limit=settings.LOCAL_RUNNER_TIME_LIMIT,
+                memory_limit=settings.LOCAL_RUNNER_MEMORY_LIMIT,
+                language_ids=settings.LOCAL_RUNNER_LANGUAGE_IDS,
+            ))
+        else:
+            raise ValueError(f'unknown execution backend {kind!r}')
+    return backends
+
+
+_pool: Union[BackendPool, None] = None
+
+
+async def start() -> None:
+    # called from the app's startup hook, after the http client
+    global _pool
+    if _pool is not None:
+        return
+    _pool = BackendPool(create_backends())
+    await _pool.start()
+
+
+async def stop() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.stop()
+    _pool = None
+
+
+def get_pool() -> BackendPool:
+    if _pool is None:
+        raise RuntimeError('execution backends have not been started')
+    return _pool
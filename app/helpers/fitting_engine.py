@@ -0,0 +1,204 @@
+"""closed-form least-squares fitting of the complexity models"""
+# standard library imports
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Tuple, Union
+import logging
+import threading
+
+# external library imports
+import numpy as np
+import scipy
+
+# internal imports
+from app.helpers import complexity_models
+import app.settings as settings
+
+
+def get_linear_models() -> List[complexity_models.ComplexityModel]:
+    return [m for m in complexity_models.MODELS.values() if m.is_linear]
+
+
+def build_design_matrices(
+    x_data: Union[complexity_models.Basis, List[float]],
+    models: List[complexity_models.ComplexityModel],
+) -> np.ndarray:
+    # stacks the design matrix of every linear model into one array of shape
+    # (num_models, num_points, widest basis); narrower models are padded
+    # with zero columns, which the pseudo-inverse maps to zero coefficients
+    basis = complexity_models.Basis.of(x_data)
+    width = max(model.num_params for model in models)
+    design = np.zeros((len(models), len(basis), width))
+    for i, model in enumerate(models):
+        design[i, :, :model.num_params] = model.design_matrix(basis)
+    return design
+
+
+class LinearSystems(NamedTuple):
+    """what the least-squares problems of the linear models share for given
+    sizes and weights, whatever the runtimes"""
+    # design matrices with their columns scaled to unit max, so that x^2
+    # and 1 are comparable, and the scale of each column
+    scaled_design: np.ndarray
+    scale: np.ndarray
+    sqrt_weights: np.ndarray
+    # scaled_design with its rows multiplied by sqrt_weights
+    weighted_design: np.ndarray
+    # pseudo-inverse of weighted_design^T weighted_design
+    inverse_gram: np.ndarray
+
+
+# (sizes, weights, model names) -> systems, least recently used first,
+# holding at most LINEAR_SYSTEMS_CACHE_BYTES; the lock is for the thread
+# fit executor
+_linear_systems: 'OrderedDict[tuple, LinearSystems]' = OrderedDict()
+_linear_systems_bytes = 0
+_linear_systems_lock = threading.Lock()
+
+
+def _get_size(key: tuple, systems: LinearSystems) -> int:
+    return len(key[0]) + len(key[1] or b'') + \
+        sum(array.nbytes for array in systems)
+
+
+def _build_linear_systems(
+    x_bytes: bytes, weights_bytes: Union[bytes, None],
+    model_names: Tuple[str, ...],
+) -> LinearSystems:
+    x = np.frombuffer(x_bytes, dtype=np.float64)
+    models = [complexity_models.MODELS[name] for name in model_names]
+    design = build_design_matrices(x, models)
+    scale = np.abs(design).max(axis=1, keepdims=True)
+    scale[scale==0] = 1
+    scaled_design = design/scale
+    sqrt_weights = np.ones(len(x)) if weights_bytes is None \
+        else np.sqrt(np.frombuffer(weights_bytes, dtype=np.float64))
+    weighted_design = scaled_design*sqrt_weights[:, None]
+    transposed = np.swapaxes(weighted_design, 1, 2)
+    inverse_gram = np.linalg.pinv(transposed @ weighted_design, hermitian=True)
+    systems = LinearSystems(
+        scaled_design, scale, sqrt_weights, weighted_design, inverse_gram
+    )
+    for array in systems:
+        # shared by every caller with the same sizes
+        array.setflags(write=False)
+    return systems
+
+
+def get_linear_systems(
+    x_data: List[float], weights: Union[List[float], None],
+    models: List[complexity_models.ComplexityModel],
+) -> LinearSystems:
+    # the fit and the leverages of the same sizes and weights build the
+    # design matrices and invert them once
+    global _linear_systems_bytes
+    x = np.ascontiguousarray(x_data, dtype=np.float64)
+    weights_bytes = None if weights is None \
+        else np.ascontiguousarray(weights, dtype=np.float64).tobytes()
+    key = (x.tobytes(), weights_bytes, tuple(model.name for model in models))
+    with _linear_systems_lock:
+        if (systems := _linear_systems.get(key)) is not None:
+            _linear_systems.move_to_end(key)
+            return systems
+    systems = _build_linear_systems(*key)
+    if (size := _get_size(key, systems)) > settings.LINEAR_SYSTEMS_CACHE_BYTES:
+        return systems
+    with _linear_systems_lock:
+        if key not in _linear_systems:
+            _linear_systems[key] = systems
+            _linear_systems_bytes += size
+        while _linear_systems_bytes > settings.LINEAR_SYSTEMS_CACHE_BYTES:
+            evicted = _linear_systems.popitem(last=False)
+            _linear_systems_bytes -= _get_size(*evicted)
+    return systems
+
+
+def get_linear_leverages(
+    x_data: List[float], weights: Union[List[float], None] = None,
+    models: Union[List[complexity_models.ComplexityModel], None] = None,
+) -> np.ndarray:
+    # diagonal of the hat matrix A (A^T A)^+ A^T of every linear model, as a
+    # (num_models, num_points) array, without forming the matrices
+    models = get_linear_models() if models is None else models
+    systems = get_linear_systems(x_data, weights, models)
+    weighted_design = systems.weighted_design
+    return np.sum(
+        (weighted_design @ systems.inverse_gram)*weighted_design, axis=-1
+    )
+
+
+def get_nonlinear_leverages(
+    model: complexity_models.ComplexityModel, x_data: List[float],
+    params: List[float], weights: Union[List[float], None] = None,
+) -> np.ndarray:
+    # hat matrix diagonal of the model linearised around the fitted
+    # parameters, J (J^T J)^+ J^T, with a finite-difference jacobian J
+    params = np.asarray(params, dtype=np.float64)
+    steps = 1e-6*np.maximum(np.abs(params), 1)
+    basis = complexity_models.Basis.of(x_data)
+    output = model.evaluate(basis, params)
+    jacobian = np.stack([
+        (model.evaluate(basis, params + step) - output)/step[i]
+        for i, step in enumerate(np.diag(steps))
+    ], axis=1)
+    if weights is not None:
+        jacobian = jacobian*np.sqrt(np.asarray(weights))[:, None]
+    inverse_gram = np.linalg.pinv(jacobian.T @ jacobian, hermitian=True)
+    return np.sum((jacobian @ inverse_gram)*jacobian, axis=-1)
+
+
+def fit_linear_models(
+    x_data: List[float], runtime_list: List[float],
+    weights: Union[List[float], None] = None,
+    models: Union[List[complexity_models.ComplexityModel], None] = None,
+) -> Tuple[Dict[str, List[float]], np.ndarray]:
+    # solves the linear models (every registered one by default) in one
+    # batched (weighted) least-squares pass
+    # returns the parameters of each model by name and the
+    # (num_models, num_points) array of model outputs
+    models = get_linear_models() if models is None else models
+    y = np.asarray(runtime_list, dtype=np.float64)
+    systems = get_linear_systems(x_data, weights, models)
+    # normal equations of every model at once: (A^T A) c = A^T y
+    transposed = np.swapaxes(systems.weighted_design, 1, 2)
+    moments = transposed @ (y*systems.sqrt_weights)
+    coefficients = systems.inverse_gram @ moments[..., None]
+    outputs = (systems.scaled_design @ coefficients)[..., 0]
+    coefficients = coefficients[..., 0]
+    coefficients = coefficients/systems.scale[:, 0, :]
+
+    args = {
+        model.name: coefficients[i, :model.num_params].tolist()
+        for i, model in enumerate(models)
+    }
+    return args, outputs
+
+
+def fit_nonlinear_model(
+    model: complexity_models.ComplexityModel,
+    x_data: List[float], runtime_list: List[float],
+    weights: Union[List[float], None] = None,
+) -> Tuple[List[float], bool]:
+    # models that aren't linear in their parameters are fitted iteratively,
+    # starting from the model's own initial guess so that fewer iterations
+    # are needed; returns the parameters and whether the fit converged
+    x = np.asarray(x_data, dtype=np.float64)
+    y = np.asarray(runtime_list, dtype=np.float64)
+    p0 = [0]*model.num_params
+    if model.initial_guess is not None:
+        p0 = model.initial_guess(x, y)
+    bounded = np.isfinite(model.bounds).any()
+    try:
+        fitted_args, _ = scipy.optimize.curve_fit(
+            f=model.evaluator, method="trf" if bounded else "lm", xdata=x,
+            ydata=y, p0=p0, bounds=model.bounds,
+            sigma=None if weights is None else 1/np.sqrt(weights),
+        )
+    except RuntimeError as e:
+        if 'Optimal parameters not found' in e.args[0]:
+            logging.debug(
+                f'{model.name} parameters not found for points. Error trace: {e} '
+                f'x_data={x_data}\nruntime_list={runtime_list}'
+            )
+            return [runtime_list[0]]*model.num_params, False
+        raise RuntimeError(e)
+    return list(fitted_args), True
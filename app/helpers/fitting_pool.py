@@ -0,0 +1,88 @@
+"""worker pool for the model fits, so that scipy never blocks the event loop
+and the polling of other requests"""
+# standard library imports
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, TypeVar, Union
+import asyncio
+import multiprocessing
+
+# internal imports
+from app.helpers import metrics
+import app.settings as settings
+
+T = TypeVar('T')
+
+_executor: Union[Executor, None] = None
+_slots: Union[asyncio.Semaphore, None] = None
+
+
+def warm_up() -> None:
+    # imports numpy and scipy and runs a small fit, so the first real fit
+    # doesn't pay for the imports and lazy initialisation
+    from app.helpers import estimate_complexity
+    estimate_complexity.get_complexity_estimates(
+        [[i, i*0.001] for i in range(1, 9)], 1
+    )
+
+
+def _create_executor() -> Union[Executor, None]:
+    if settings.FIT_EXECUTOR == 'process':
+        # spawned rather than forked: forking a process that runs an event
+        # loop and open sockets isn't safe
+        return ProcessPoolExecutor(
+            max_workers=settings.FIT_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=warm_up,
+        )
+    if settings.FIT_EXECUTOR == 'thread':
+        return ThreadPoolExecutor(
+            max_workers=settings.FIT_WORKERS, initializer=warm_up,
+        )
+    return None
+
+
+async def start() -> None:
+    # creates the pool and waits until every worker is up and warmed up;
+    # called from the app's startup hook
+    global _executor, _slots
+    if _executor is not None:
+        return
+    _slots = asyncio.Semaphore(settings.FIT_MAX_PENDING)
+    if (executor := _create_executor()) is None:
+        return
+    # workers are started on demand: submitting one task per worker at once
+    # makes the pool start, and warm up, all of them now
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(
+        loop.run_in_executor(executor, warm_up)
+        for _ in range(settings.FIT_WORKERS)
+    ))
+    _executor = executor
+
+
+async def stop() -> None:
+    global _executor, _slots
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+    _slots = None
+
+
+async def run(func: Callable[..., T], *args) -> T:
+    # runs func(*args) in the pool; at most FIT_MAX_PENDING fits are handed
+    # to the pool at once and the rest wait their turn here
+    # without a pool (scripts, benchmarks) the fit runs in the caller
+    if _slots is None:
+        with metrics.stage_timer('fit'):
+            return func(*args)
+    with metrics.stage_timer('fit_wait'):
+        await _slots.acquire()
+    try:
+        with metrics.stage_timer('fit'):
+            if _executor is None:
+                return func(*args)
+            return await asyncio.get_running_loop().run_in_executor(
+                _executor, func, *args
+            )
+    finally:
+        _slots.release()
@@ -0,0 +1,52 @@
+"""application-scoped aiohttp session used for all outgoing http requests"""
+# standard library imports
+from typing import Union
+import asyncio
+
+# external library imports
+import aiohttp
+
+# internal imports
+import app.settings as settings
+
+_session: Union[aiohttp.ClientSession, None] = None
+_loop: Union[asyncio.AbstractEventLoop, None] = None
+
+
+async def start() -> None:
+    # creates the shared session; called from the app's startup hook
+    global _session, _loop
+    if _session is not None and not _session.closed:
+        return
+    connector = aiohttp.TCPConnector(
+        limit=settings.HTTP_CONNECTION_LIMIT,
+        limit_per_host=settings.HTTP_CONNECTION_LIMIT_PER_HOST,
+        keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=settings.HTTP_REQUEST_TIMEOUT,
+        connect=settings.HTTP_CONNECT_TIMEOUT,
+    )
+    _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    _loop = asyncio.get_running_loop()
+
+
+async def close() -> None:
+    # closes the shared session; called from the app's shutdown hook
+    global _session, _loop
+    if _session is not None:
+        await _session.close()
+    _session = None
+    _loop = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    if _session is None or _session.closed:
+        raise RuntimeError('http client has not been started')
+    return _session
+
+
+def get_loop() -> Union[asyncio.AbstractEventLoop, None]:
+    # event loop that owns the session, for scheduling from other threads
+    return _loop
@@ -1,7 +1,9 @@
 # standard library imports
-import random
 import string
-from typing import List, Union
+from typing import Iterator, List, Tuple, Union
+
+# external library imports
+import numpy as np
 
 # internal imports
 import app.settings as settings
@@ -24,22 +26,48 @@ def get_string_input_sample_pool(allowed_char_code: str) -> str:
     return ''.join(sample_pool)
 
 
-def generate_string_inputs(
+def generate_random_string(
+    sample_pool: str, length: int, rng: np.random.Generator,
+) -> str:
+    # draws every character in one vectorised call instead of one
+    # random.choice per character
+    pool = np.frombuffer(sample_pool.encode('ascii'), dtype=np.uint8)
+    indices = rng.integers(0, len(pool), size=length)
+    return pool[indices].tobytes().decode('ascii')
+
+
+def get_string_input_lengths(
     str_info: website_data.CodeSubmissionStringDetails,
     num_inputs: int,
-) -> List[str]:
-
-    sample_pool = get_string_input_sample_pool(str_info.characters_allowed)
-    if str_info.max_length <= num_inputs:
+) -> range:
+    max_length = min(str_info.max_length, settings.MAX_STRING_LENGTH)
+    if max_length <= num_inputs:
         step = 1
     else:
-        # generate num_inputs inputs starting size 1
-        step = str_info.max_length // num_inputs
-    inputs_list = []
-    for i in range(1, str_info.max_length, step):
-        item = ''.join([random.choice(sample_pool) for _ in range(i)])
-        inputs_list.append(item)
-    return inputs_list
+        # generate num_inputs inputs starting size 1
+        step = max_length // num_inputs
+    return range(1, max_length, step)
+
+
+def iter_string_inputs(
+    str_info: website_data.CodeSubmissionStringDetails,
+    num_inputs: int,
+    seed: Union[int, None] = None,
+) -> Iterator[str]:
+    # yields the inputs one by one so that the first ones can be submitted
+    # while the later (longer) ones are still being generated
+    rng = np.random.default_rng(seed)
+    sample_pool = get_string_input_sample_pool(str_info.characters_allowed)
+    for i in get_string_input_lengths(str_info, num_inputs):
+        yield generate_random_string(sample_pool, i, rng)
+
+
+def generate_string_inputs(
+    str_info: website_data.CodeSubmissionStringDetails,
+    num_inputs: int,
+    seed: Union[int, None] = None,
+) -> List[str]:
+    return list(iter_string_inputs(str_info, num_inputs, seed))
 
 
 def generate_number_inputs(
@@ -58,3 +86,45 @@ def generate_number_inputs(
         input_list.append(num)
         num += step
     return input_list
+
+
+def get_input_size(
+    inp: Union[str, int, float], input_type: int,
+) -> Union[int, float]:
+    # strings are measured by their length, numbers by their value
+    if str(input_type) == settings.STRING_INPUT_CODE:
+        return len(inp)
+    return inp
+
+
+def get_input_size_range(
+    data: website_data.CodeSubmissions,
+) -> Union[Tuple[Union[int, float], Union[int, float], bool], None]:
+    # smallest size, largest size and whether sizes must be integers
+    if data.input_type == 0:    # string length
+        return 1, min(
+            data.string_details.max_length, settings.MAX_STRING_LENGTH
+        ), True
+    elif data.input_type == 1:  # number value
+        return (
+            data.number_details.range_start, data.number_details.range_end,
+            data.number_details.numbers_allowed
+            not in settings.FLOAT_ALLOWED_CODES_LIST,
+        )
+    return None
+
+
+def generate_inputs_for_sizes(
+    data: website_data.CodeSubmissions, sizes: List[Union[int, float]],
+) -> List[Union[str, int, float]]:
+    # one input per requested size
+    if data.input_type == 0:
+        rng = np.random.default_rng()
+        sample_pool = get_string_input_sample_pool(
+            data.string_details.characters_allowed
+        )
+        return [
+            generate_random_string(sample_pool, int(size), rng)
+            for size in sizes
+        ]
+    return list(sizes)
@@ -0,0 +1,166 @@
+"""background workers that run the estimate jobs submitted through the job
+api and record their progress in the job store"""
+# standard library imports
+from typing import List, Set, Tuple, Union
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+
+# internal imports
+from app.helpers import (
+    job_store, metrics, notifs, pipeline, result_cache, scheduler,
+    shared_state,
+)
+from app.models import website_data
+import app.settings as settings
+
+store = job_store.create_job_store()
+_queue: Union[asyncio.Queue, None] = None
+_workers: List[asyncio.Task] = []
+_recovery: Union[asyncio.Task, None] = None
+# owner of this process's jobs when there is no shared state
+_process_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+class JobQueueFullError(Exception):
+    """raised when no more jobs can be queued"""
+
+
+def _owner() -> str:
+    if (state := shared_state.get_state()) is not None:
+        return state.worker_id
+    return _process_id
+
+
+async def _live_owners() -> Set[str]:
+    # without shared state the other processes can't be seen, so only this
+    # one counts as live
+    if (state := shared_state.get_state()) is not None:
+        return await state.live_workers()
+    return {_process_id}
+
+
+async def submit(data: website_data.CodeSubmissions, client_id: str) -> str:
+    # queues a job and returns its id
+    if _queue is None or _queue.full():
+        raise JobQueueFullError('job queue is full')
+    await store.prune(time.time() - settings.JOB_TTL)
+    job_id = uuid.uuid4().hex
+    await store.create({
+        'id': job_id,
+        'status': 'queued',
+        'created_at': time.time(),
+        'partial_runtimes': [],
+        'status_code': None,
+        'result': None,
+    }, {'data': json.loads(data.json()), 'client_id': client_id}, _owner())
+    _queue.put_nowait((job_id, data, client_id))
+    return job_id
+
+
+async def recover_orphans() -> int:
+    # queues again the unfinished jobs of the workers that went away (or of
+    # the previous run of the app), as many as there is room for
+    adopted = await store.adopt_orphans(
+        _owner(), await _live_owners(),
+        _queue.maxsize - _queue.qsize(),
+    )
+    for job_id, request in adopted:
+        data = website_data.CodeSubmissions.parse_obj(request['data'])
+        await store.update(job_id, status='queued', partial_runtimes=[])
+        _queue.put_nowait((job_id, data, request['client_id']))
+    if adopted:
+        logging.warning(f'requeued {len(adopted)} orphaned jobs')
+    return len(adopted)
+
+
+async def _recover_forever() -> None:
+    while True:
+        await asyncio.sleep(settings.JOB_RECOVERY_INTERVAL)
+        try:
+            await recover_orphans()
+        except Exception as e:
+            logging.warning(f'job recovery failed: {e}')
+
+
+async def run_job(
+    job_id: str, data: website_data.CodeSubmissions, client_id: str,
+) -> Tuple[int, Union[dict, str]]:
+    await store.update(job_id, status='running')
+    cache_key = result_cache.make_cache_key(data)
+    if (cached_estimates := await result_cache.cache.get(cache_key)):
+        return 200, {**cached_estimates, 'cache_hit': True}
+
+    partial_runtimes = []
+
+    async def on_progress(new_runtimes: List) -> None:
+        partial_runtimes.extend(new_runtimes)
+        await store.update(job_id, partial_runtimes=list(partial_runtimes))
+
+    while True:
+        try:
+            async with scheduler.scheduler.admit(
+                client_id, pipeline.get_execution_budget(data)
+            ):
+                status_code, body = await pipeline.run_estimation(
+                    data, on_progress
+                )
+            break
+        except scheduler.SchedulerFullError as e:
+            # the job was accepted already, so it waits instead of failing
+            await asyncio.sleep(e.retry_after)
+
+    if status_code != 200:
+        return status_code, body
+    await result_cache.cache.set(cache_key, body)
+    return status_code, {**body, 'cache_hit': False}
+
+
+async def _work() -> None:
+    while True:
+        job_id, data, client_id = await _queue.get()
+        try:
+            with metrics.track_timings() as timings:
+                status_code, body = await run_job(job_id, data, client_id)
+            await store.finish(
+                job_id, status='done' if status_code == 200 else 'failed',
+                status_code=status_code, result=body, timings=timings,
+            )
+        except Exception as e:
+            notifs.notify(
+                f'error occured in job `{job_id}`\nerror trace: {e}'
+                f'\ndata: {data}'
+            )
+            await store.finish(
+                job_id, status='failed', status_code=500,
+                result={'error': [str(e)]},
+            )
+        finally:
+            _queue.task_done()
+
+
+async def start() -> None:
+    # after shared_state.start(), so that this worker counts as live
+    global _queue, _workers, _recovery
+    _queue = asyncio.Queue(maxsize=settings.JOB_QUEUE_MAX_SIZE)
+    _workers = [
+        asyncio.create_task(_work()) for _ in range(settings.JOB_WORKERS)
+    ]
+    await recover_orphans()
+    # other workers can only be seen to go away through the shared state
+    if shared_state.get_state() is not None:
+        _recovery = asyncio.create_task(_recover_forever())
+
+
+async def stop() -> None:
+    global _workers, _recovery
+    tasks = _workers + ([_recovery] if _recovery is not None else [])
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _workers = []
+    _recovery = None
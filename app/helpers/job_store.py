@@ -0,0 +1,216 @@
+"""storage of the state of asynchronous estimate jobs"""
+# standard library imports
+from abc import ABC, abstractmethod
+from contextlib import closing, contextmanager
+from typing import Dict, Iterator, List, Set, Tuple, Union
+import asyncio
+import json
+import sqlite3
+import time
+
+# internal imports
+from app.helpers import shared_state
+import app.settings as settings
+
+
+class JobStore(ABC):
+    """interface of the job stores; a job is a json-serialisable dict with
+    at least `id`, `status` and `updated_at`
+
+    until a job is finished the store also keeps its request, everything
+    needed to run it again, and the worker that owns it, so that the jobs
+    of a worker that went away can be taken over; the request isn't part of
+    the job as it is shown to clients"""
+
+    @abstractmethod
+    async def create(self, job: dict, request: dict, owner: str) -> None:
+        pass
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Union[dict, None]:
+        pass
+
+    @abstractmethod
+    async def update(self, job_id: str, **fields) -> None:
+        pass
+
+    @abstractmethod
+    async def finish(self, job_id: str, **fields) -> None:
+        # last update of the job, which drops its request
+        pass
+
+    @abstractmethod
+    async def adopt_orphans(
+        self, owner: str, live_owners: Set[str], limit: int,
+    ) -> List[Tuple[str, dict]]:
+        # makes owner the owner of up to limit unfinished jobs whose owner
+        # isn't among live_owners, and returns their ids and requests
+        pass
+
+    @abstractmethod
+    async def prune(self, older_than: float) -> int:
+        # removes jobs last updated before older_than (unix time)
+        pass
+
+
+class InMemoryJobStore(JobStore):
+    """jobs live in the process and are lost on restart"""
+
+    def __init__(self) -> None:
+        self._jobs: Dict[str, dict] = {}
+        # job id -> [request, owner] of the unfinished jobs
+        self._requests: Dict[str, List] = {}
+
+    async def create(self, job: dict, request: dict, owner: str) -> None:
+        self._jobs[job['id']] = {**job, 'updated_at': time.time()}
+        self._requests[job['id']] = [request, owner]
+
+    async def get(self, job_id: str) -> Union[dict, None]:
+        if (job := self._jobs.get(job_id)) is None:
+            return None
+        return dict(job)
+
+    async def update(self, job_id: str, **fields) -> None:
+        self._jobs[job_id].update(fields, updated_at=time.time())
+
+    async def finish(self, job_id: str, **fields) -> None:
+        await self.update(job_id, **fields)
+        self._requests.pop(job_id, None)
+
+    async def adopt_orphans(
+        self, owner: str, live_owners: Set[str], limit: int,
+    ) -> List[Tuple[str, dict]]:
+        adopted = []
+        for job_id, request in self._requests.items():
+            if len(adopted) >= limit:
+                break
+            if request[1] not in live_owners:
+                request[1] = owner
+                adopted.append((job_id, request[0]))
+        return adopted
+
+    async def prune(self, older_than: float) -> int:
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job['updated_at'] < older_than
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._requests.pop(job_id, None)
+        return len(expired)
+
+
+class SqliteJobStore(JobStore):
+    """jobs are kept in a sqlite file and survive restarts; the worker
+    processes sharing the file see each other's jobs"""
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, record TEXT, updated_at REAL)'
+            )
+            # the unfinished jobs
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS job_requests ('
+                'id TEXT PRIMARY KEY, request TEXT, owner TEXT)'
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # commits when the block succeeds and closes the connection after it
+        with closing(shared_state.connect(self.db_path)) as conn, conn:
+            yield conn
+
+    def _write(self, job: dict, request: dict, owner: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO jobs VALUES (?, ?, ?)',
+                (job['id'], json.dumps(job), job['updated_at']),
+            )
+            conn.execute(
+                'INSERT OR REPLACE INTO job_requests VALUES (?, ?, ?)',
+                (job['id'], json.dumps(request), owner),
+            )
+
+    def _read(self, job_id: str) -> Union[dict, None]:
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT record FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def _update(self, job_id: str, fields: dict, finished: bool) -> None:
+        # read and write in one transaction, holding the write lock from the
+        # start so that another worker's write can't come in between
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT record FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+            job = {**json.loads(row[0]), **fields, 'updated_at': time.time()}
+            conn.execute(
+                'UPDATE jobs SET record = ?, updated_at = ? WHERE id = ?',
+                (json.dumps(job), job['updated_at'], job_id),
+            )
+            if finished:
+                conn.execute(
+                    'DELETE FROM job_requests WHERE id = ?', (job_id,)
+                )
+
+    def _adopt_orphans(
+        self, owner: str, live_owners: Set[str], limit: int,
+    ) -> List[Tuple[str, dict]]:
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            orphans = [
+                (job_id, request) for job_id, request, job_owner in
+                conn.execute('SELECT id, request, owner FROM job_requests')
+                if job_owner not in live_owners
+            ][:limit]
+            conn.executemany(
+                'UPDATE job_requests SET owner = ? WHERE id = ?',
+                [(owner, job_id) for job_id, _ in orphans],
+            )
+        return [(job_id, json.loads(request)) for job_id, request in orphans]
+
+    def _prune(self, older_than: float) -> int:
+        with self._connect() as conn:
+            removed = conn.execute(
+                'DELETE FROM jobs WHERE updated_at < ?', (older_than,)
+            ).rowcount
+            conn.execute(
+                'DELETE FROM job_requests WHERE id NOT IN (SELECT id FROM jobs)'
+            )
+            return removed
+
+    async def create(self, job: dict, request: dict, owner: str) -> None:
+        await asyncio.to_thread(
+            self._write, {**job, 'updated_at': time.time()}, request, owner
+        )
+
+    async def get(self, job_id: str) -> Union[dict, None]:
+        return await asyncio.to_thread(self._read, job_id)
+
+    async def update(self, job_id: str, **fields) -> None:
+        await asyncio.to_thread(self._update, job_id, fields, False)
+
+    async def finish(self, job_id: str, **fields) -> None:
+        await asyncio.to_thread(self._update, job_id, fields, True)
+
+    async def adopt_orphans(
+        self, owner: str, live_owners: Set[str], limit: int,
+    ) -> List[Tuple[str, dict]]:
+        return await asyncio.to_thread(
+            self._adopt_orphans, owner, live_owners, limit
+        )
+
+    async def prune(self, older_than: float) -> int:
+        return await asyncio.to_thread(self._prune, older_than)
+
+
+def create_job_store() -> JobStore:
+    if settings.JOB_STORE_DB_PATH:
+        return SqliteJobStore(settings.JOB_STORE_DB_PATH)
+    return InMemoryJobStore()
@@ -0,0 +1,67 @@
+"""in-memory list of the compiler's active languages, refreshed in the
+background so that requests never wait on the compiler"""
+# standard library imports
+from typing import List, Union
+import asyncio
+import logging
+
+# internal imports
+from app.helpers import code_compiler, notifs
+import app.settings as settings
+
+_languages: Union[List[dict], None] = None
+_refresh_task: Union[asyncio.Task, None] = None
+
+
+async def refresh() -> bool:
+    # fetches the list from the compiler; keeps the previous list on failure
+    global _languages
+    try:
+        language_list = await code_compiler.get_active_languages()
+    except Exception as e:
+        logging.error(f'failed to fetch the active languages: {e}')
+        language_list = None
+    if language_list:
+        _languages = language_list
+        return True
+    return False
+
+
+async def _refresh_periodically(compiler_is_up: bool) -> None:
+    while True:
+        await asyncio.sleep(
+            settings.LANGUAGES_REFRESH_INTERVAL if compiler_is_up
+            else settings.LANGUAGES_RETRY_INTERVAL
+        )
+        compiler_was_up, compiler_is_up = compiler_is_up, await refresh()
+        if compiler_was_up and not compiler_is_up:
+            # notify once per outage, stale data is served meanwhile
+            notifs.notify(
+                message="compiler didn't return the active languages list"
+            )
+
+
+async def start() -> None:
+    # warms the list and starts the background refresh
+    global _refresh_task
+    if not (compiler_is_up := await refresh()):
+        notifs.notify(
+            message="compiler didn't return the active languages list"
+        )
+    _refresh_task = asyncio.create_task(_refresh_periodically(compiler_is_up))
+
+
+async def stop() -> None:
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+    _refresh_task = None
+
+
+def get_languages() -> Union[List[dict], None]:
+    # the last list fetched from the compiler, None if it never answered
+    return _languages
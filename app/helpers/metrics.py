@@ -0,0 +1,220 @@
+"""counters and per-stage timers of the estimation pipeline, exposed in the
+prometheus text format on /metrics and, per request, as a timings block"""
+# standard library imports
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, List, Tuple, TypeVar, Union
+import time
+
+T = TypeVar('T')
+
+STAGE_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60,
+)
+
+# seconds spent in each stage by the request being handled, if it asked
+_request_timings: ContextVar[Union[Dict[str, float], None]] = ContextVar(
+    'request_timings', default=None
+)
+_registry: List[Union['Counter', 'Histogram']] = []
+
+
+def _format_labels(label_names: Tuple[str, ...], values: Tuple) -> str:
+    if not label_names:
+        return ''
+    pairs = ','.join(
+        f'{name}="{value}"' for name, value in zip(label_names, values)
+    )
+    return '{' + pairs + '}'
+
+
+class Counter:
+    """a monotonically increasing count, optionally split by labels"""
+
+    def __init__(
+        self, name: str, description: str, label_names: Tuple[str, ...] = (),
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._values: Dict[Tuple, float] = {}
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.label_names)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [
+            f'# HELP {self.name} {self.description}',
+            f'# TYPE {self.name} counter',
+        ]
+        for key, value in sorted(self._values.items()):
+            lines.append(
+                f'{self.name}{_format_labels(self.label_names, key)} {value}'
+            )
+        return lines
+
+
+class Histogram:
+    """observations counted into cumulative buckets, with their sum"""
+
+    def __init__(
+        self, name: str, description: str, label_names: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = STAGE_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        # per label values: count per bucket (the last one is +Inf) and sum
+        self._values: Dict[Tuple, Tuple[List[int], float]] = {}
+        _registry.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.label_names)
+        counts, total = self._values.get(
+            key, ([0]*(len(self.buckets) + 1), 0.0)
+        )
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-1] += 1
+        self._values[key] = (counts, total + value)
+
+    def render(self) -> List[str]:
+        lines = [
+            f'# HELP {self.name} {self.description}',
+            f'# TYPE {self.name} histogram',
+        ]
+        for key, (counts, total) in sorted(self._values.items()):
+            for bound, count in zip([*self.buckets, '+Inf'], counts):
+                labels = _format_labels(
+                    (*self.label_names, 'le'), (*key, bound)
+                )
+                lines.append(f'{self.name}_bucket{labels} {count}')
+            labels = _format_labels(self.label_names, key)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {counts[-1]}')
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    'estimator_stage_seconds', 'seconds spent in each stage of an estimate',
+    ('stage',),
+)
+SUBMISSIONS_CREATED = Counter(
+    'estimator_submissions_created_total', 'submissions created on judge0',
+)
+SUBMISSIONS_REJECTED = Counter(
+    'estimator_submissions_rejected_total',
+    'submissions judge0 returned no token for',
+)
+BACKEND_FAILOVERS = Counter(
+    'estimator_backend_failovers_total',
+    'submission batches moved on after an execution backend failed',
+    ('backend',),
+)
+POLL_ROUNDS = Counter(
+    'estimator_poll_rounds_total', 'rounds of polling for submission results',
+)
+POLL_REQUESTS = Counter(
+    'estimator_poll_requests_total', 'batch requests for submission results',
+)
+JUDGE0_STATUSES = Counter(
+    'estimator_judge0_statuses_total',
+    'judge0 status ids seen while polling', ('status',),
+)
+EARLY_ABORTS = Counter(
+    'estimator_early_aborts_total',
+    'estimates given up on before all inputs ran, by what failed',
+    ('reason',),
+)
+RANGES_SHRUNK = Counter(
+    'estimator_ranges_shrunk_total',
+    'estimates fitted below the sizes that exceeded the time limit',
+)
+SINGLE_FLIGHT_JOINED = Counter(
+    'estimator_single_flight_joined_total',
+    'requests that waited for an identical estimate already running',
+)
+SINGLE_FLIGHT_CANCELLED = Counter(
+    'estimator_single_flight_cancelled_total',
+    'running estimates cancelled because all their clients went away',
+)
+FIT_FALLBACKS = Counter(
+    'estimator_fit_fallbacks_total',
+    'fits that did not converge and fell back to default parameters',
+    ('model',),
+)
+NOTIFICATIONS_SENT = Counter(
+    'estimator_notifications_sent_total', 'notifications sent to discord',
+)
+NOTIFICATIONS_COALESCED = Counter(
+    'estimator_notifications_coalesced_total',
+    'repeated notifications folded into a single message',
+)
+NOTIFICATIONS_DROPPED = Counter(
+    'estimator_notifications_dropped_total',
+    'notifications dropped because the queue was full',
+)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if (timings := _request_timings.get()) is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def timed_iterator(stage: str, iterable: Iterable[T]) -> Iterator[T]:
+    # times how long the items of a lazy iterable take to produce, recorded
+    # once the iterable is exhausted or the iteration stops
+    iterator = iter(iterable)
+    elapsed = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - started
+            yield item
+    finally:
+        record_stage(stage, elapsed)
+
+
+@contextmanager
+def track_timings() -> Iterator[Dict[str, float]]:
+    # collects the stage timings of the code run within, including the
+    # tasks it starts, into the yielded dict
+    timings = {}
+    token = _request_timings.set(timings)
+    started = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        timings['total'] = time.perf_counter() - started
+        _request_timings.reset(token)
+
+
+def record_fit_fallbacks(estimates: dict) -> None:
+    for name in estimates.get('fit_fallbacks', []):
+        FIT_FALLBACKS.inc(model=name)
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
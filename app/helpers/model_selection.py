@@ -0,0 +1,97 @@
+"""selection of the complexity model by information criterion or leave-one-out
+cross-validation, for every model at once"""
+# standard library imports
+from typing import Dict, List, Union
+
+# external library imports
+import numpy as np
+
+# internal imports
+from app.helpers import complexity_models, fitting_engine
+import app.settings as settings
+
+# residual sums of squares below this are treated as a perfect fit
+MIN_RSS = 1e-12
+# leverages are capped below 1 so that loo residuals stay finite
+MAX_LEVERAGE = 1 - 1e-8
+
+
+def get_leverages(
+    x_data: List[float], model_args: Dict[str, List[float]],
+    weights: Union[List[float], None] = None,
+) -> np.ndarray:
+    # (num_models, num_points) hat matrix diagonals in registry order
+    linear_leverages = dict(zip(
+        [m.name for m in fitting_engine.get_linear_models()],
+        fitting_engine.get_linear_leverages(x_data, weights),
+    ))
+    return np.vstack([
+        linear_leverages[name] if model.is_linear
+        else fitting_engine.get_nonlinear_leverages(
+            model, x_data, model_args[name], weights
+        )
+        for name, model in complexity_models.MODELS.items()
+    ])
+
+
+def score_models(
+    x_data: List[float], runtime_list: List[float],
+    model_args: Dict[str, List[float]],
+    weights: Union[List[float], None] = None,
+) -> Dict[str, np.ndarray]:
+    # aic, bic and the leave-one-out mean squared error of every registered
+    # model, in registry order; the loo residuals come from the hat matrix
+    # diagonal, e_i/(1 - h_ii), rather than from n refits
+    models = complexity_models.MODELS.values()
+    y = np.asarray(runtime_list, dtype=np.float64)
+    w = np.ones_like(y) if weights is None else np.asarray(weights)/np.mean(weights)
+    basis = complexity_models.Basis(x_data)
+    outputs = np.vstack([
+        model.evaluate(basis, model_args[model.name]) for model in models
+    ])
+    residuals = y - outputs
+    n = len(y)
+    # parameters of the model and the variance of the noise
+    k = np.array([model.num_params + 1 for model in models])
+
+    rss = np.maximum(np.sum(w*residuals**2, axis=1), MIN_RSS)
+    deviance = n*np.log(rss/n)
+    leverages = np.minimum(
+        get_leverages(basis.x, model_args, weights), MAX_LEVERAGE
+    )
+    loo_residuals = residuals/(1 - leverages)
+    loo_mse = np.maximum(np.mean(w*loo_residuals**2, axis=1), MIN_RSS/n)
+    return {
+        'aic': deviance + 2*k,
+        'bic': deviance + k*np.log(n),
+        'loo_mse': loo_mse,
+        # on the same scale as the deviance, so that it ranks like aic
+        'loo': n*np.log(loo_mse),
+    }
+
+
+def rank_models(
+    scores: Dict[str, np.ndarray], criterion: Union[str, None] = None,
+) -> List[dict]:
+    # models from best to worst by the criterion, with their relative
+    # likelihood exp(-delta/2) against the best and their weight, the
+    # relative likelihoods normalised to sum to 1 (the akaike weights for
+    # aic); criterion is 'aic', 'bic' or 'loo'
+    criterion = criterion or settings.MODEL_SELECTION_CRITERION
+    delta = scores[criterion] - np.min(scores[criterion])
+    relative_likelihoods = np.exp(-delta/2)
+    weights = relative_likelihoods/np.sum(relative_likelihoods)
+    # stable sort, so that ties go to the simpler model
+    order = np.argsort(delta, kind='stable')
+    names = list(complexity_models.MODELS)
+    return [
+        {
+            'model': names[i],
+            'aic': float(scores['aic'][i]),
+            'bic': float(scores['bic'][i]),
+            'loo_mse': float(scores['loo_mse'][i]),
+            'relative_likelihood': float(relative_likelihoods[i]),
+            'weight': float(weights[i]),
+        }
+        for i in order
+    ]
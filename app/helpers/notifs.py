@@ -1,16 +1,172 @@
-"""sends a notification to discord"""
+"""sends notifications to discord from a background sender, so that alerting
+never blocks a request and an outage doesn't flood the channel"""
 # standard library imports
+from typing import Dict, List, Union
+import asyncio
+import logging
 import os
+import time
 
-# external library imports
-import requests
+# internal imports
+from app.helpers import http_client, metrics
+import app.settings as settings
 
-def send_message_on_discord(message: str) -> None:
+
+async def send_message_on_discord(message: str) -> None:
     if (discord_server_webhook_url := os.getenv('DISCORD_URL', None)):
-        requests.post(
-            url=discord_server_webhook_url,
-            json={"content": message},
-            headers={"Content-Type": "application/json"}
-        )
+        try:
+            async with http_client.get_session().post(
+                url=discord_server_webhook_url,
+                json={"content": message},
+                headers={"Content-Type": "application/json"}
+            ):
+                pass
+        except Exception as e:
+            # a failing notification must not hide the original error
+            logging.error(f'failed to send message on discord: {e}')
     else:
         print(message)
+
+
+class NotificationDispatcher:
+    """queues messages for a background sender
+
+    identical messages, compared by their first two lines (where and what
+    the error is), are sent once per NOTIFY_DEDUPE_WINDOW followed by a
+    count of the repeats; sending is rate limited by a token bucket and
+    messages that don't fit in the queue are dropped and counted"""
+
+    def __init__(
+        self, max_queued: int, dedupe_window: float, rate: float, burst: int,
+    ) -> None:
+        self.dedupe_window = dedupe_window
+        self.rate = rate    # messages per second
+        self.burst = burst
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        # key -> [start of its dedupe window, repeats within the window]
+        self._recent: Dict[str, List] = {}
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._sender: Union[asyncio.Task, None] = None
+
+    @staticmethod
+    def _dedupe_key(message: str) -> str:
+        return '\n'.join(message.split('\n')[:2])
+
+    def _enqueue(self, message: str) -> None:
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            metrics.NOTIFICATIONS_DROPPED.inc()
+
+    def notify(self, message: str) -> None:
+        # never blocks; must be called from the event loop's thread
+        key = self._dedupe_key(message)
+        now = time.monotonic()
+        if (recent := self._recent.get(key)) is not None and \
+                now - recent[0] < self.dedupe_window:
+            recent[1] += 1
+            metrics.NOTIFICATIONS_COALESCED.inc()
+            return
+        self._flush_window(key)
+        self._recent[key] = [now, 0]
+        self._enqueue(message)
+
+    def _flush_window(self, key: str) -> None:
+        # reports the repeats of a message whose window has ended
+        if (recent := self._recent.pop(key, None)) is not None and recent[1]:
+            self._enqueue(
+                f'{key}\n(repeated {recent[1]} more times in '
+                f'{self.dedupe_window:g}s)'
+            )
+
+    def _flush_expired_windows(self) -> None:
+        now = time.monotonic()
+        for key, (started, _) in list(self._recent.items()):
+            if now - started >= self.dedupe_window:
+                self._flush_window(key)
+
+    async def _take_token(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._refilled)*self.rate
+            )
+            self._refilled = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens)/self.rate)
+
+    async def _send_forever(self) -> None:
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    self._queue.get(), timeout=self.dedupe_window
+                )
+            except asyncio.TimeoutError:
+                self._flush_expired_windows()
+                continue
+            await self._take_token()
+            await send_message_on_discord(message)
+            metrics.NOTIFICATIONS_SENT.inc()
+            self._flush_expired_windows()
+
+    def start(self) -> None:
+        if self._sender is None:
+            self._sender = asyncio.create_task(self._send_forever())
+
+    async def stop(self) -> None:
+        # sends what is still queued, as far as the rate limit allows quickly
+        if self._sender is None:
+            return
+        self._sender.cancel()
+        try:
+            await self._sender
+        except asyncio.CancelledError:
+            pass
+        self._sender = None
+        for key in list(self._recent):
+            self._flush_window(key)
+        while not self._queue.empty() and self._tokens >= 1:
+            self._tokens -= 1
+            await send_message_on_discord(self._queue.get_nowait())
+
+
+_dispatcher: Union[NotificationDispatcher, None] = None
+
+
+async def start() -> None:
+    # called from the app's startup hook, after the http client
+    global _dispatcher
+    _dispatcher = NotificationDispatcher(
+        max_queued=settings.NOTIFY_QUEUE_SIZE,
+        dedupe_window=settings.NOTIFY_DEDUPE_WINDOW,
+        rate=settings.NOTIFY_RATE,
+        burst=settings.NOTIFY_BURST,
+    )
+    _dispatcher.start()
+
+
+async def stop() -> None:
+    global _dispatcher
+    if _dispatcher is not None:
+        await _dispatcher.stop()
+    _dispatcher = None
+
+
+def notify(message: str) -> None:
+    # queues the message without waiting; printed when the dispatcher isn't
+    # running (scripts, benchmarks)
+    if _dispatcher is None:
+        print(message)
+        return
+    _dispatcher.notify(message)
+
+
+def notify_threadsafe(message: str) -> None:
+    # for sync code running outside the event loop (threadpool routes)
+    if (loop := http_client.get_loop()) is None:
+        print(message)
+        return
+    loop.call_soon_threadsafe(notify, message)
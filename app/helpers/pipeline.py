@@ -0,0 +1,112 @@
+"""the estimation pipeline: generate inputs, run them on the compiler and fit
+the complexity models"""
+# standard library imports
+from typing import Awaitable, Callable, List, Set, Tuple, Union
+import logging
+import math
+
+# external library imports
+from fastapi import status
+import numpy as np
+
+# internal imports
+from app.helpers import (
+    code_compiler, estimate_complexity,
+    fitting_pool, input_generator, metrics, timing_harness,
+)
+from app.models import website_data
+import app.settings as settings
+
+ProgressCallback = Callable[[List], Awaitable[None]]
+
+
+def uses_timing_harness(data: website_data.CodeSubmissions) -> bool:
+    return data.timing_harness and timing_harness.supports(data.language_id)
+
+
+def get_execution_budget(data: website_data.CodeSubmissions) -> int:
+    # most compiler executions the job can use
+    canary = 1 if settings.CANARY_ENABLED else 0
+    inputs = settings.MAX_INPUTS
+    if uses_timing_harness(data):
+        inputs = math.ceil(inputs/settings.HARNESS_INPUTS_PER_RUN)
+    return inputs + canary
+
+
+async def get_runtimes(
+    data: website_data.CodeSubmissions,
+    on_progress: Union[ProgressCallback, None] = None,
+) -> Union[Tuple[bool, Tuple[np.ndarray, np.ndarray]], Tuple[bool, Set[str]], None]:
+    # returns (is_error, (sizes, runtimes) or errors) like
+    # code_compiler.get_runtimes_from_tokens, None for an unknown input_type
+    if input_generator.get_input_size_range(data) is None:
+        return None
+
+    samples = None
+    if settings.CANARY_ENABLED:
+        # give up after a single execution if the code can't run at all
+        is_error, canary = await code_compiler.run_canary(data)
+        if is_error:
+            return True, canary
+        if not uses_timing_harness(data):
+            # its runtime includes the startup the harness leaves out
+            samples = canary
+
+    # gether inputs for the code
+    if not (input_list := code_compiler.generate_inputs_for_code(data)):
+        return None
+
+    # submit inputs to the compiler, next to the canary's run
+    submitted = len(samples) if samples else 0
+    if submitted and on_progress:
+        await on_progress(np.column_stack(samples.successful()).tolist())
+    if len(samples := await code_compiler.submit_inputs(
+        code=data.code,
+        language_id=data.language_id,
+        input_list=input_list,
+        input_type=data.input_type,
+        store=samples,
+        harness=uses_timing_harness(data),
+        repetitions=data.repetitions,
+    )) == submitted:
+        # no submission ids - failed to make submissions in compiler
+        logging.error(
+            'got empty submissions tokens dict; args:\n'
+            f'code={data.code}\nlanguage_id={data.language_id}\n'
+            f'input_type={data.input_type}'
+        )
+        raise Exception('empty submission tokens dict returned')
+
+    # get runtime of each submission
+    return await code_compiler.get_runtimes_from_tokens(samples, on_progress)
+
+
+async def run_estimation(
+    data: website_data.CodeSubmissions,
+    on_progress: Union[ProgressCallback, None] = None,
+) -> Tuple[int, Union[dict, str]]:
+    # returns the http status code and the body of the estimate
+    # on_progress is awaited with the [size, runtime] pairs as they arrive
+    if (runtimes := await get_runtimes(data, on_progress)) is None:
+        return (
+            status.HTTP_400_BAD_REQUEST,
+            "`input_type` value not recognised",
+        )
+
+    is_error, outputs = runtimes
+    if is_error:
+        # send one of the compiler errors
+        return (
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+            {'error': list(outputs)},
+        )
+
+    # estimate time complexity and return the best fitting model
+    sizes, runtimes = outputs
+    estimates = await fitting_pool.run(
+        estimate_complexity.estimate_from_samples, sizes, runtimes
+    )
+    metrics.record_fit_fallbacks(estimates)
+    return status.HTTP_200_OK, {
+        **estimates, 'timing_harness': uses_timing_harness(data),
+    }
@@ -0,0 +1,168 @@
+"""content-addressed cache of complexity estimates"""
+# standard library imports
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+from typing import Iterator, Tuple, Union
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+
+# internal imports
+from app.helpers import shared_state
+from app.models import website_data
+import app.settings as settings
+
+
+def make_cache_key(data: website_data.CodeSubmissions) -> str:
+    # hash of everything that decides the generated inputs and the runtimes
+    # only the details of the chosen input type are part of the key
+    input_spec = None
+    if data.input_type == 0 and data.string_details:
+        input_spec = {
+            'characters_allowed': data.string_details.characters_allowed,
+            'max_length': data.string_details.max_length,
+        }
+    elif data.input_type == 1 and data.number_details:
+        input_spec = {
+            'numbers_allowed': data.number_details.numbers_allowed,
+            'range_start': float(data.number_details.range_start),
+            'range_end': float(data.number_details.range_end),
+        }
+    payload = json.dumps(
+        {
+            'code': data.code,
+            'language_id': data.language_id,
+            'input_type': data.input_type,
+            'input_spec': input_spec,
+            'repetitions': data.repetitions,
+            'timing_harness': data.timing_harness,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """in-process LRU with a TTL, optionally backed by a sqlite file that
+    survives restarts and can be shared by the worker processes; with
+    max_entries 0 there is no in-process tier"""
+
+    def __init__(
+        self, max_entries: int, ttl: float, db_path: Union[str, None] = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self._entries: OrderedDict[str, Tuple[float, dict]] = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if db_path:
+            with self._connect() as conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS results ('
+                    'key TEXT PRIMARY KEY, value TEXT, stored_at REAL)'
+                )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # commits when the block succeeds and closes the connection after it
+        with closing(shared_state.connect(self.db_path)) as conn, conn:
+            yield conn
+
+    def _read_disk(self, key: str) -> Union[Tuple[float, dict], None]:
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT stored_at, value FROM results WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def _write_disk(self, key: str, stored_at: float, value: dict) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?)',
+                (key, json.dumps(value), stored_at),
+            )
+
+    def _delete_disk(self, key: Union[str, None]) -> int:
+        with self._connect() as conn:
+            if key is None:
+                return conn.execute('DELETE FROM results').rowcount
+            return conn.execute(
+                'DELETE FROM results WHERE key = ?', (key,)
+            ).rowcount
+
+    def _remember(self, key: str, stored_at: float, value: dict) -> None:
+        if not self.max_entries:
+            return
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _is_fresh(self, stored_at: float) -> bool:
+        return time.time() - stored_at < self.ttl
+
+    async def get(self, key: str) -> Union[dict, None]:
+        if (entry := self._entries.get(key)) is not None:
+            if self._is_fresh(entry[0]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[1])
+            # expired
+            del self._entries[key]
+            self.evictions += 1
+        if self.db_path:
+            entry = await asyncio.to_thread(self._read_disk, key)
+            if entry is not None and self._is_fresh(entry[0]):
+                self._remember(key, *entry)
+                self.hits += 1
+                self.disk_hits += 1
+                return dict(entry[1])
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: dict) -> None:
+        stored_at = time.time()
+        self._remember(key, stored_at, value)
+        if self.db_path:
+            await asyncio.to_thread(self._write_disk, key, stored_at, value)
+
+    async def invalidate(self, key: Union[str, None] = None) -> int:
+        # removes one entry, or every entry when key is None
+        # returns the number of entries removed from the largest tier
+        if key is None:
+            removed = len(self._entries)
+            self._entries.clear()
+        else:
+            removed = int(self._entries.pop(key, None) is not None)
+        if self.db_path:
+            removed = max(
+                removed, await asyncio.to_thread(self._delete_disk, key)
+            )
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+cache = ResultCache(
+    # workers sharing the disk tier keep no copies of their own, so that an
+    # invalidation holds for all of them
+    max_entries=0 if settings.SHARED_STATE_DB_PATH
+    else settings.RESULT_CACHE_MAX_ENTRIES,
+    ttl=settings.RESULT_CACHE_TTL,
+    db_path=settings.RESULT_CACHE_DB_PATH,
+)
@@ -0,0 +1,108 @@
+"""compact store of the samples of an estimate: the input size, runtime and
+judge0 status of every run, indexed by the token of its submission
+
+only sizes are kept, so the generated inputs can be released as soon as
+they are submitted"""
+# standard library imports
+from array import array
+from collections import Counter
+from typing import Counter as CounterType, Dict, List, Set, Tuple, Union
+
+# external library imports
+import numpy as np
+
+PENDING = 0     # no result yet
+ACCEPTED = 3    # judge0's status id of a successful run
+TIME_LIMIT_EXCEEDED = 5
+
+
+class SampleStore:
+    """parallel arrays of sizes, runtimes and statuses; a token maps to the
+    positions of its runs in the arrays, several when the submission ran a
+    timing harness over several inputs"""
+
+    def __init__(self) -> None:
+        self._index: Dict[str, range] = {}
+        self.sizes = array('d')
+        self.runtimes = array('d')
+        self.statuses = array('h')
+        self.errors: Set[str] = set()
+        # runs per error message, leaving out time limits, which depend on
+        # the input size rather than on the program being broken
+        self.failures: CounterType[str] = Counter()
+        # tokens of the submissions that ran a timing harness
+        self.harnessed: Set[str] = set()
+
+    def __len__(self) -> int:
+        # number of runs
+        return len(self.sizes)
+
+    def __contains__(self, token: str) -> bool:
+        return token in self._index
+
+    @property
+    def tokens(self) -> List[str]:
+        # in submission order
+        return list(self._index)
+
+    @property
+    def pending_tokens(self) -> List[str]:
+        return [
+            token for token, rows in self._index.items()
+            if self.statuses[rows[0]] == PENDING
+        ]
+
+    def add(self, token: str, size: Union[int, float]) -> None:
+        self.add_runs(token, [size])
+
+    def add_runs(
+        self, token: str, sizes: List[Union[int, float]],
+        harnessed: bool = False,
+    ) -> None:
+        # a submission running every size in turn
+        if harnessed:
+            self.harnessed.add(token)
+        start = len(self.sizes)
+        self._index[token] = range(start, start + len(sizes))
+        self.sizes.extend(sizes)
+        self.runtimes.extend([np.nan]*len(sizes))
+        self.statuses.extend([PENDING]*len(sizes))
+
+    def sizes_of(self, token: str) -> List[float]:
+        rows = self._index[token]
+        return self.sizes[rows.start:rows.stop].tolist()
+
+    def record(
+        self, token: str, status_id: int,
+        runtime: Union[float, List[float], None] = None,
+        error: Union[str, None] = None,
+    ) -> None:
+        # runtime is a list with one runtime per run of a timing harness
+        rows = self._index[token]
+        for i in rows:
+            self.statuses[i] = status_id
+        if runtime is not None:
+            if not isinstance(runtime, list):
+                runtime = [runtime]
+            self.runtimes[rows.start:rows.stop] = array('d', runtime)
+        if error is not None:
+            self.errors.add(error)
+            if status_id != TIME_LIMIT_EXCEEDED:
+                self.failures[error] += 1
+
+    def count(self, status_id: int) -> int:
+        return self.statuses.count(status_id)
+
+    def sizes_with(self, status_id: int) -> np.ndarray:
+        statuses = np.frombuffer(self.statuses, dtype=np.int16)
+        return np.frombuffer(self.sizes, dtype=np.float64)[
+            statuses == status_id
+        ]
+
+    def successful(self) -> Tuple[np.ndarray, np.ndarray]:
+        # sizes and runtimes of the accepted runs
+        accepted = np.frombuffer(self.statuses, dtype=np.int16) == ACCEPTED
+        return (
+            np.frombuffer(self.sizes, dtype=np.float64)[accepted],
+            np.frombuffer(self.runtimes, dtype=np.float64)[accepted],
+        )
@@ -0,0 +1,194 @@
+"""admission control in front of the compiler: a global budget of concurrent
+executions shared fairly between clients, with a bounded queue; the budget
+is also shared with the other worker processes when they share state"""
+# standard library imports
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Tuple
+import asyncio
+import math
+import time
+
+# external library imports
+from fastapi import Request
+
+# internal imports
+from app.helpers import shared_state
+import app.settings as settings
+
+
+class SchedulerFullError(Exception):
+    """raised when a job of client_id can't be queued; retry_after is in
+    seconds"""
+
+    def __init__(self, retry_after: int, client_id: str) -> None:
+        super().__init__(f'compiler queue is full, retry after {retry_after}s')
+        self.retry_after = retry_after
+        self.client_id = client_id
+
+
+def get_client_id(request: Request) -> str:
+    # jobs are shared fairly between api keys, or client addresses
+    if api_key := request.headers.get('x-api-key'):
+        return f'key:{api_key}'
+    return f'host:{request.client.host if request.client else "unknown"}'
+
+
+class ExecutionScheduler:
+    """grants compiler executions to jobs, taking turns between the clients
+    that have queued jobs"""
+
+    def __init__(
+        self, max_executions: int, max_queued: int, max_queued_per_client: int,
+    ) -> None:
+        self.max_executions = max_executions
+        self.max_queued = max_queued
+        self.max_queued_per_client = max_queued_per_client
+        self._available = max_executions
+        self._queues: Dict[str, Deque[Tuple[int, asyncio.Future]]] = {}
+        self._turns: Deque[str] = deque()   # clients with queued jobs
+        self.admitted = 0
+        self.rejected = 0
+        self._wait_seconds = 0.0
+        self._job_seconds = 0.0     # moving average of a job's duration
+
+    def _queued_jobs(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _dispatch(self) -> None:
+        # grants queued jobs in round-robin order of their clients; stops at
+        # the first job that doesn't fit so that large jobs aren't starved
+        while self._turns:
+            client_id = self._turns[0]
+            queue = self._queues[client_id]
+            executions, future = queue[0]
+            if executions > self._available:
+                return
+            queue.popleft()
+            self._available -= executions
+            future.set_result(None)
+            self._turns.popleft()
+            if queue:
+                self._turns.append(client_id)
+            else:
+                del self._queues[client_id]
+
+    def _remove_waiter(self, client_id: str, future: asyncio.Future) -> None:
+        queue = self._queues[client_id]
+        for waiter in queue:
+            if waiter[1] is future:
+                queue.remove(waiter)
+                break
+        if not queue:
+            del self._queues[client_id]
+            self._turns.remove(client_id)
+        # the job behind it may fit now
+        self._dispatch()
+
+    def retry_after(self) -> int:
+        # rough time until the queue ahead has drained, in whole seconds
+        if not self._job_seconds:
+            return settings.SCHEDULER_DEFAULT_RETRY_AFTER
+        queued_executions = sum(
+            executions for queue in self._queues.values()
+            for executions, _ in queue
+        )
+        rounds = (queued_executions + self.max_executions)/self.max_executions
+        return max(1, math.ceil(rounds*self._job_seconds))
+
+    async def acquire(self, client_id: str, executions: int) -> int:
+        # waits for the client's turn and for enough free executions
+        # returns the number of executions granted, to be released after
+        granted = await self._acquire_local(client_id, executions)
+        if (state := shared_state.get_state()) is not None:
+            # then for room in the budget of all the worker processes, for a
+            # while: the other workers' queues aren't seen from here
+            try:
+                await asyncio.wait_for(
+                    state.acquire_executions(granted),
+                    settings.SCHEDULER_SHARED_WAIT,
+                )
+            except asyncio.TimeoutError:
+                self._release_local(granted)
+                self.admitted -= 1
+                self.rejected += 1
+                raise SchedulerFullError(self.retry_after(), client_id)
+            except BaseException:
+                self._release_local(granted)
+                raise
+        return granted
+
+    async def _acquire_local(self, client_id: str, executions: int) -> int:
+        executions = min(executions, self.max_executions)
+        queued_for_client = len(self._queues.get(client_id, ()))
+        if not self._turns and executions <= self._available:
+            self._available -= executions
+            self.admitted += 1
+            return executions
+        if self._queued_jobs() >= self.max_queued or \
+                queued_for_client >= self.max_queued_per_client:
+            self.rejected += 1
+            raise SchedulerFullError(self.retry_after(), client_id)
+
+        future = asyncio.get_running_loop().create_future()
+        if client_id not in self._queues:
+            self._queues[client_id] = deque()
+            self._turns.append(client_id)
+        self._queues[client_id].append((executions, future))
+        started_waiting = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # granted just as the waiter went away
+                self._release_local(executions)
+            else:
+                self._remove_waiter(client_id, future)
+            raise
+        self._wait_seconds += time.monotonic() - started_waiting
+        self.admitted += 1
+        return executions
+
+    async def release(self, executions: int, job_seconds: float = 0.0) -> None:
+        self._release_local(executions, job_seconds)
+        if (state := shared_state.get_state()) is not None:
+            await state.release_executions(executions)
+
+    def _release_local(self, executions: int, job_seconds: float = 0.0) -> None:
+        self._available += executions
+        if job_seconds:
+            self._job_seconds = 0.8*self._job_seconds + 0.2*job_seconds \
+                if self._job_seconds else job_seconds
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, client_id: str, executions: int) -> AsyncIterator[None]:
+        granted = await self.acquire(client_id, executions)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            await self.release(granted, time.monotonic() - started)
+
+    async def stats(self) -> dict:
+        return {
+            'max_executions': self.max_executions,
+            'executions_in_flight': self.max_executions - self._available,
+            'queued_jobs': self._queued_jobs(),
+            'queued_jobs_per_client': {
+                client_id: len(queue) for client_id, queue in self._queues.items()
+            },
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'average_wait_seconds': self._wait_seconds/max(self.admitted, 1),
+            'average_job_seconds': self._job_seconds,
+            'shared': None if (state := shared_state.get_state()) is None
+            else await state.stats(),
+        }
+
+
+scheduler = ExecutionScheduler(
+    max_executions=settings.SCHEDULER_MAX_EXECUTIONS,
+    max_queued=settings.SCHEDULER_MAX_QUEUED_JOBS,
+    max_queued_per_client=settings.SCHEDULER_MAX_QUEUED_PER_CLIENT,
+)
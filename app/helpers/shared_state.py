@@ -0,0 +1,280 @@
+"""state shared by the worker processes serving the app on one host (uvicorn
+--workers): the budget of concurrent executions and the estimates being
+run, kept in a sqlite database in WAL mode that also holds the result cache
+and the job store"""
+# standard library imports
+from contextlib import closing, contextmanager
+from typing import Awaitable, Callable, Iterator, Set, Union
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+
+# internal imports
+import app.settings as settings
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    # WAL lets the workers read while one of them writes; a writer waits up
+    # to SHARED_STATE_BUSY_TIMEOUT for another
+    conn = sqlite3.connect(db_path, timeout=settings.SHARED_STATE_BUSY_TIMEOUT)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+class SharedState:
+    """a row per live worker with the executions it holds and its last
+    heartbeat, and a row per estimate in flight with the worker running it
+
+    a worker that stops heartbeating for SHARED_STATE_WORKER_TIMEOUT is
+    removed along with what it held, so a crashed worker doesn't keep its
+    share of the budget"""
+
+    def __init__(self, db_path: str, max_executions: int) -> None:
+        self.db_path = db_path
+        self.max_executions = max_executions
+        self.worker_id = (
+            f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        )
+        self._heartbeat: Union[asyncio.Task, None] = None
+        with closing(connect(db_path)) as conn, conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS workers ('
+                'id TEXT PRIMARY KEY, executions INTEGER, heartbeat REAL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS flights ('
+                'key TEXT PRIMARY KEY, worker_id TEXT)'
+            )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # takes the write lock up front, so what is read within can't change
+        # before it is written
+        conn = connect(self.db_path)
+        conn.isolation_level = None
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _reap(conn: sqlite3.Connection) -> None:
+        # removes the workers that stopped heartbeating and their flights
+        conn.execute(
+            'DELETE FROM workers WHERE heartbeat < ?',
+            (time.time() - settings.SHARED_STATE_WORKER_TIMEOUT,),
+        )
+        conn.execute(
+            'DELETE FROM flights WHERE worker_id NOT IN (SELECT id FROM workers)'
+        )
+
+    def _beat(self) -> None:
+        # a worker reaped while it was stalled comes back holding nothing
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO workers VALUES (?, 0, ?) ON CONFLICT(id) '
+                'DO UPDATE SET heartbeat = excluded.heartbeat',
+                (self.worker_id, time.time()),
+            )
+            self._reap(conn)
+
+    def _take(self, executions: int) -> bool:
+        with self._transaction() as conn:
+            self._reap(conn)
+            in_flight, = conn.execute(
+                'SELECT COALESCE(SUM(executions), 0) FROM workers'
+            ).fetchone()
+            if in_flight + executions > self.max_executions:
+                return False
+            conn.execute(
+                'INSERT INTO workers VALUES (?, ?, ?) ON CONFLICT(id) '
+                'DO UPDATE SET executions = executions + excluded.executions',
+                (self.worker_id, executions, time.time()),
+            )
+            return True
+
+    def _claim(self, key: str) -> bool:
+        with self._transaction() as conn:
+            self._reap(conn)
+            row = conn.execute(
+                'SELECT worker_id FROM flights WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and row[0] != self.worker_id:
+                return False
+            conn.execute(
+                'INSERT OR REPLACE INTO flights VALUES (?, ?)',
+                (key, self.worker_id),
+            )
+            return True
+
+    def _is_claimed(self, key: str) -> bool:
+        with closing(connect(self.db_path)) as conn:
+            return conn.execute(
+                'SELECT 1 FROM flights JOIN workers ON workers.id = worker_id '
+                'WHERE key = ? AND heartbeat >= ?',
+                (key, time.time() - settings.SHARED_STATE_WORKER_TIMEOUT),
+            ).fetchone() is not None
+
+    def _live_workers(self) -> Set[str]:
+        with closing(connect(self.db_path)) as conn:
+            return {worker_id for worker_id, in conn.execute(
+                'SELECT id FROM workers WHERE heartbeat >= ?',
+                (time.time() - settings.SHARED_STATE_WORKER_TIMEOUT,),
+            )}
+
+    def _land(self, key: str) -> None:
+        with closing(connect(self.db_path)) as conn, conn:
+            conn.execute(
+                'DELETE FROM flights WHERE key = ? AND worker_id = ?',
+                (key, self.worker_id),
+            )
+
+    def _unregister(self) -> None:
+        with closing(connect(self.db_path)) as conn, conn:
+            conn.execute(
+                'DELETE FROM flights WHERE worker_id = ?', (self.worker_id,)
+            )
+            conn.execute('DELETE FROM workers WHERE id = ?', (self.worker_id,))
+
+    @staticmethod
+    async def _poll(func: Callable[[], Awaitable[bool]]) -> None:
+        # until func returns True, backing off between the calls
+        delay = settings.SHARED_STATE_POLL_INITIAL_DELAY
+        while not await func():
+            await asyncio.sleep(delay)
+            delay = min(delay*2, settings.SHARED_STATE_POLL_MAX_DELAY)
+
+    async def _try_take(self, executions: int) -> bool:
+        taking = asyncio.ensure_future(asyncio.to_thread(self._take, executions))
+        try:
+            return await asyncio.shield(taking)
+        except asyncio.CancelledError:
+            # executions taken just as the caller went away are given back
+            taking.add_done_callback(
+                lambda task: not task.cancelled() and
+                task.exception() is None and task.result() and
+                asyncio.ensure_future(self.release_executions(executions))
+            )
+            raise
+
+    async def acquire_executions(self, executions: int) -> None:
+        # waits until the executions fit in the budget of all the workers
+        await self._poll(lambda: self._try_take(executions))
+
+    def _release(self, executions: int) -> None:
+        with closing(connect(self.db_path)) as conn, conn:
+            conn.execute(
+                'UPDATE workers SET executions = MAX(executions - ?, 0) '
+                'WHERE id = ?',
+                (executions, self.worker_id),
+            )
+
+    async def release_executions(self, executions: int) -> None:
+        # shielded, so that the executions are given back even when the
+        # caller is cancelled meanwhile
+        await asyncio.shield(asyncio.to_thread(self._release, executions))
+
+    async def claim(self, key: str) -> bool:
+        # whether this worker is the one to run the estimate of key
+        claiming = asyncio.ensure_future(asyncio.to_thread(self._claim, key))
+        try:
+            return await asyncio.shield(claiming)
+        except asyncio.CancelledError:
+            # a claim made just as the caller went away is landed, or the
+            # other workers would wait for an estimate nobody runs
+            claiming.add_done_callback(
+                lambda task: not task.cancelled() and
+                task.exception() is None and task.result() and
+                asyncio.ensure_future(self.land(key))
+            )
+            raise
+
+    async def wait_for(self, key: str) -> None:
+        # until no live worker is running the estimate of key
+        async def is_free() -> bool:
+            return not await asyncio.to_thread(self._is_claimed, key)
+
+        await self._poll(is_free)
+
+    async def land(self, key: str) -> None:
+        await asyncio.to_thread(self._land, key)
+
+    async def live_workers(self) -> Set[str]:
+        # the ids of the workers that are heartbeating
+        return await asyncio.to_thread(self._live_workers)
+
+    async def _beat_forever(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self._beat)
+            except sqlite3.Error as e:
+                # missed beats are fine as long as they aren't all missed
+                logging.warning(f'shared state heartbeat failed: {e}')
+            await asyncio.sleep(settings.SHARED_STATE_HEARTBEAT)
+
+    async def start(self) -> None:
+        await asyncio.to_thread(self._beat)
+        self._heartbeat = asyncio.create_task(self._beat_forever())
+
+    async def stop(self) -> None:
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            try:
+                await self._heartbeat
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat = None
+        await asyncio.to_thread(self._unregister)
+
+    def _stats(self) -> dict:
+        with closing(connect(self.db_path)) as conn:
+            workers, in_flight = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(executions), 0) FROM workers '
+                'WHERE heartbeat >= ?',
+                (time.time() - settings.SHARED_STATE_WORKER_TIMEOUT,),
+            ).fetchone()
+            flights, = conn.execute('SELECT COUNT(*) FROM flights').fetchone()
+        return {
+            'worker_id': self.worker_id,
+            'workers': workers,
+            'executions_in_flight': in_flight,
+            'estimates_in_flight': flights,
+        }
+
+    async def stats(self) -> dict:
+        return await asyncio.to_thread(self._stats)
+
+
+_state: Union[SharedState, None] = None
+
+
+async def start() -> None:
+    # called from the app's startup hook, in every worker process; nothing
+    # is shared when SHARED_STATE_DB_PATH is unset
+    global _state
+    if settings.SHARED_STATE_DB_PATH:
+        _state = SharedState(
+            settings.SHARED_STATE_DB_PATH, settings.SCHEDULER_MAX_EXECUTIONS,
+        )
+        await _state.start()
+
+
+async def stop() -> None:
+    global _state
+    if _state is not None:
+        await _state.stop()
+    _state = None
+
+
+def get_state() -> Union[SharedState, None]:
+    return _state
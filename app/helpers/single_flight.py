@@ -0,0 +1,83 @@
+"""coalesces identical estimates that are in flight at the same time: the
+first request runs the pipeline, the ones arriving while it runs wait for
+its result instead of running it again"""
+# standard library imports
+from typing import Awaitable, Callable, Dict, TypeVar, Union
+import asyncio
+
+# internal imports
+from app.helpers import metrics
+import app.settings as settings
+
+T = TypeVar('T')
+
+
+class ClientDisconnectedError(Exception):
+    """raised to a waiter whose client went away before the result came"""
+
+
+class Flight:
+    """a call running in its own task and the number of callers waiting
+    for it"""
+
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """runs at most one call per key at a time
+
+    the call runs in a task of its own, so a caller that stops waiting
+    doesn't cancel it for the others; it is cancelled once its last caller
+    has stopped waiting"""
+
+    def __init__(self) -> None:
+        self._flights: Dict[str, Flight] = {}
+
+    def _join(self, key: str, func: Callable[[], Awaitable[T]]) -> Flight:
+        if (flight := self._flights.get(key)) is not None:
+            metrics.SINGLE_FLIGHT_JOINED.inc()
+            return flight
+        flight = Flight(asyncio.ensure_future(func()))
+        self._flights[key] = flight
+        flight.task.add_done_callback(lambda _: self._land(key, flight))
+        return flight
+
+    def _land(self, key: str, flight: Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def run(
+        self, key: str, func: Callable[[], Awaitable[T]],
+        is_disconnected: Union[Callable[[], Awaitable[bool]], None] = None,
+    ) -> T:
+        # awaits func() or, if a call with the same key is running, that
+        # call's result; is_disconnected is checked every
+        # SINGLE_FLIGHT_DISCONNECT_CHECK seconds and ends the wait with
+        # ClientDisconnectedError when it returns True
+        flight = self._join(key, func)
+        flight.waiters += 1
+        try:
+            while True:
+                done, _ = await asyncio.wait(
+                    {flight.task},
+                    timeout=settings.SINGLE_FLIGHT_DISCONNECT_CHECK,
+                )
+                if done:
+                    return flight.task.result()
+                if is_disconnected is not None and await is_disconnected():
+                    raise ClientDisconnectedError()
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # nobody is left to receive the result
+                metrics.SINGLE_FLIGHT_CANCELLED.inc()
+                flight.task.cancel()
+                self._land(key, flight)
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+
+estimates = SingleFlight()
@@ -0,0 +1,58 @@
+"""wraps code in a harness that runs several inputs in one process and times
+each of them from within, so that the startup of the interpreter isn't part
+of the runtimes and one execution measures several sizes
+
+the inputs are sent as a json list on stdin and the harness writes a line
+with the marker and the seconds of every input to stderr"""
+# standard library imports
+from typing import List, Union
+import json
+
+MARKER = '__runtime__'
+
+# wall time of each input, since cpu time only moves in clock ticks under
+# a cpu limit and small inputs would read 0; stdout is discarded, a call to
+# exit() ends only the current input
+PYTHON_HARNESS = '''import io, json, os, sys, time
+_code = compile({code!r}, 'main.py', 'exec')
+_inputs = json.loads(sys.stdin.read())
+sys.stdout = open(os.devnull, 'w')
+for _input in _inputs:
+    sys.stdin = io.StringIO(_input)
+    _started = time.perf_counter()
+    try:
+        exec(_code, {{'__name__': '__main__'}})
+    except SystemExit:
+        pass
+    _elapsed = time.perf_counter() - _started
+    print({marker!r}, repr(_elapsed), file=sys.stderr, flush=True)
+'''
+
+# judge0 language id -> harness
+HARNESSES = {
+    71: PYTHON_HARNESS,     # python 3
+}
+
+
+def supports(language_id: int) -> bool:
+    return int(language_id) in HARNESSES
+
+
+def wrap(code: str, language_id: int) -> str:
+    return HARNESSES[int(language_id)].format(code=code, marker=MARKER)
+
+
+def encode_inputs(inputs: List) -> str:
+    return json.dumps([str(i) for i in inputs])
+
+
+def parse_timings(log: Union[str, None]) -> List[float]:
+    # the timings the harness wrote, in the order of the inputs
+    timings = []
+    for line in (log or '').splitlines():
+        if line.startswith(MARKER):
+            try:
+                timings.append(float(line[len(MARKER):]))
+            except ValueError:
+                continue
+    return timings
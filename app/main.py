@@ -1,19 +1,33 @@
 """this is the entrypoint file"""
 # standard library imports
-from typing import List, Union
-import functools
+from typing import List, Tuple, Union
 import logging
+import secrets
 
 # external library imports
-from fastapi import FastAPI, Response, status
+from fastapi import FastAPI, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
 # internal imports
 from app.models import website_data
-from app.helpers import code_compiler, estimate_complexity
+from app.helpers import code_compiler
 import app.settings as settings
 from app.helpers import decorators
+from app.helpers import estimate_stream
+from app.helpers import execution_backends
+from app.helpers import fitting_pool
+from app.helpers import http_client
+from app.helpers import job_queue
+from app.helpers import languages_provider
+from app.helpers import metrics
 from app.helpers import notifs
+from app.helpers import pipeline
+from app.helpers import result_cache
+from app.helpers import scheduler
+from app.helpers import shared_state
+from app.helpers import single_flight
 
 app = FastAPI(debug=settings.debug_state)
 
@@ -33,6 +47,29 @@ class HealthyEndpointFilter(logging.Filter):
 logging.getLogger("uvicorn.access").addFilter(HealthyEndpointFilter())
 
 
+@app.on_event('startup')
+async def startup() -> None:
+    # one pooled http session for the lifetime of the app
+    await http_client.start()
+    await notifs.start()
+    await shared_state.start()
+    await execution_backends.start()
+    await languages_provider.start()
+    await fitting_pool.start()
+    await job_queue.start()
+
+
+@app.on_event('shutdown')
+async def shutdown() -> None:
+    await job_queue.stop()
+    await fitting_pool.stop()
+    await languages_provider.stop()
+    await execution_backends.stop()
+    await shared_state.stop()
+    await notifs.stop()
+    await http_client.close()
+
+
 @app.get('/')
 @decorators.catchall_exceptions
 def base_url() -> str:
@@ -47,18 +84,14 @@ def health_check() -> bool:
     return True
 
 
-@functools.lru_cache(maxsize=5)
 @app.get('/get_active_languages', status_code=status.HTTP_200_OK)
-@decorators.catchall_exceptions
-def programming_languages(response: Response) -> Union[List, None]:
-    # return the data by judge0
-    # or an error code if fetch if not successful
-    if language_list:=code_compiler.get_active_languages():
+@decorators.async_catchall_exceptions
+async def programming_languages(response: Response) -> Union[List, None]:
+    # return the last list fetched from judge0, possibly stale if judge0 is
+    # down; the list is refreshed in the background
+    if language_list:=languages_provider.get_languages():
         return language_list
-    # noitify that the compiler is down
-    notifs.send_message_on_discord(
-        message="compiler didn't return the active languages list"
-    )
+    # judge0 hasn't answered since startup
     response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
     return None
 
@@ -67,38 +100,200 @@ def programming_languages(response: Response) -> Union[List, None]:
 @decorators.async_catchall_exceptions
 async def estimate_code_complexity(
         data: website_data.CodeSubmissions,
+        request: Request,
+        response: Response,
+        timings: bool = False
+    ) -> Union[dict, str]:
+    # with ?timings=true the seconds spent in each stage are added to the
+    # body as a `timings` block
+    with metrics.track_timings() as stage_timings:
+        body = await run_estimate(data, request, response)
+    if timings and isinstance(body, dict):
+        return {**body, 'timings': stage_timings}
+    return body
+
+
+async def run_estimate(
+        data: website_data.CodeSubmissions,
+        request: Request,
         response: Response
     ) -> Union[dict, str]:
-    # gether inputs for the code
-    if not (input_list := code_compiler.generate_inputs_for_code(data)):
+    # serve repeated submissions from the cache
+    cache_key = result_cache.make_cache_key(data)
+    if (cached_estimates := await result_cache.cache.get(cache_key)):
+        return {**cached_estimates, 'cache_hit': True}
+
+    # identical requests arriving while this one runs wait for its result
+    client_id = scheduler.get_client_id(request)
+    while True:
+        try:
+            response.status_code, body = await single_flight.estimates.run(
+                cache_key,
+                lambda: estimate_and_cache(data, client_id, cache_key),
+                request.is_disconnected,
+            )
+        except scheduler.SchedulerFullError as e:
+            if e.client_id != client_id:
+                # the estimate joined was turned away for the client that
+                # started it; this client runs it under its own quota
+                continue
+            response.status_code = status.HTTP_429_TOO_MANY_REQUESTS
+            response.headers['Retry-After'] = str(e.retry_after)
+            return str(e)
+        except single_flight.ClientDisconnectedError:
+            # nobody reads this response
+            response.status_code = 499
+            return 'client disconnected'
+        break
+
+    if response.status_code != status.HTTP_200_OK:
+        return body
+    return {**body, 'cache_hit': False}
+
+
+async def estimate_and_cache(
+        data: website_data.CodeSubmissions,
+        client_id: str,
+        cache_key: str
+    ) -> Tuple[int, Union[dict, str]]:
+    # another worker process may be running the same estimate; its result
+    # is then read from the shared cache once it is done
+    if (state := shared_state.get_state()) is not None:
+        while not await state.claim(cache_key):
+            await state.wait_for(cache_key)
+            if (cached_estimates := await result_cache.cache.get(cache_key)):
+                return status.HTTP_200_OK, cached_estimates
+    try:
+        # wait for a share of the compiler, or raise SchedulerFullError so
+        # the client is asked to come back later
+        async with scheduler.scheduler.admit(
+            client_id, pipeline.get_execution_budget(data),
+        ):
+            status_code, body = await pipeline.run_estimation(data)
+        if status_code == status.HTTP_200_OK:
+            await result_cache.cache.set(cache_key, body)
+    finally:
+        if state is not None:
+            await state.land(cache_key)
+    return status_code, body
+
+
+@app.post('/estimate_complexity/stream', status_code=200)
+@decorators.async_catchall_exceptions
+async def estimate_code_complexity_stream(
+        data: website_data.CodeSubmissions,
+        request: Request,
+        response: Response
+    ) -> Union[StreamingResponse, str]:
+    # streams provisional estimates as server-sent events while the
+    # submissions run, ending with a `result` or an `error` event
+    # inputs are streamed one per execution, without a timing harness; the
+    # cache key says so, so that the result is shared with unharnessed
+    # estimates of /estimate_complexity only
+    data = data.copy(update={'timing_harness': False})
+    cache_key = result_cache.make_cache_key(data)
+    if (cached_estimates := await result_cache.cache.get(cache_key)):
+        return StreamingResponse(
+            iter([estimate_stream.format_event(
+                'result', {**cached_estimates, 'cache_hit': True}
+            )]),
+            media_type='text/event-stream',
+        )
+
+    if not (sizes := code_compiler.get_input_sizes_for_code(data)):
         response.status_code = status.HTTP_400_BAD_REQUEST
         return "`input_type` value not recognised"
 
-    # submit inputs to the compiler
-    if not (submission_tokens_dict:=await code_compiler.get_submission_tokens_dict(
-        code=data.code,
-        language_id=data.language_id,
-        input_list=input_list,
-    )):
-        # no submission ids - failed to make submissions in compiler
-        logging.error(
-            'got empty submissions tokens dict; args:\n'
-            f'code={data.code}\nlanguage_id={data.language_id}\n'
-            f'inputs={input_list}'
+    try:
+        executions = await scheduler.scheduler.acquire(
+            scheduler.get_client_id(request),
+            pipeline.get_execution_budget(data),
         )
-        raise Exception('empty submission tokens dict returned')
+    except scheduler.SchedulerFullError as e:
+        response.status_code = status.HTTP_429_TOO_MANY_REQUESTS
+        response.headers['Retry-After'] = str(e.retry_after)
+        return str(e)
 
-    # get runtime of each submission
-    is_error, outputs = await code_compiler.get_runtimes_from_tokens(
-        submission_tokens_dict
+    # the executions are given back once the stream has ended
+    return StreamingResponse(
+        estimate_stream.stream_estimates(data, sizes, cache_key),
+        media_type='text/event-stream',
+        background=BackgroundTask(scheduler.scheduler.release, executions),
     )
-    if is_error:
-        # send one of the compiler errors
-        response.status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
-        return {'error': outputs}
-
-    # estimate time complexity and return the best fitting model
-    return estimate_complexity.get_complexity_estimates(
-        input_and_time_list=outputs,
-        input_type=data.input_type
+
+
+@app.post('/jobs', status_code=status.HTTP_202_ACCEPTED)
+@decorators.async_catchall_exceptions
+async def create_job(
+        data: website_data.CodeSubmissions,
+        request: Request,
+        response: Response
+    ) -> Union[dict, str]:
+    # queues the estimate and returns its id right away; poll /jobs/{id}
+    try:
+        job_id = await job_queue.submit(data, scheduler.get_client_id(request))
+    except job_queue.JobQueueFullError as e:
+        response.status_code = status.HTTP_429_TOO_MANY_REQUESTS
+        response.headers['Retry-After'] = str(
+            settings.SCHEDULER_DEFAULT_RETRY_AFTER
+        )
+        return str(e)
+    return {'job_id': job_id, 'status': 'queued'}
+
+
+@app.get('/jobs/{job_id}')
+@decorators.async_catchall_exceptions
+async def get_job(job_id: str, response: Response) -> Union[dict, None]:
+    # status, runtimes gathered so far and, once done, the result
+    if (job := await job_queue.store.get(job_id)) is None:
+        response.status_code = status.HTTP_404_NOT_FOUND
+    return job
+
+
+@app.get('/metrics', response_class=PlainTextResponse)
+@decorators.catchall_exceptions
+def prometheus_metrics() -> str:
+    # stage timings and pipeline counters in the prometheus text format
+    return metrics.render()
+
+
+@app.get('/scheduler_stats')
+@decorators.async_catchall_exceptions
+async def scheduler_stats() -> dict:
+    return await scheduler.scheduler.stats()
+
+
+@app.get('/backend_stats')
+@decorators.catchall_exceptions
+def backend_stats() -> List[dict]:
+    return execution_backends.get_pool().stats()
+
+
+@app.get('/cache_stats')
+@decorators.catchall_exceptions
+def cache_stats() -> dict:
+    return result_cache.cache.stats()
+
+
+def is_admin(request: Request) -> bool:
+    # whether the request carries the admin key; nobody is admin when
+    # ADMIN_API_KEY is unset
+    return bool(settings.ADMIN_API_KEY) and secrets.compare_digest(
+        request.headers.get('x-admin-key', '').encode(),
+        settings.ADMIN_API_KEY.encode(),
     )
+
+
+@app.post('/invalidate_cache')
+@decorators.async_catchall_exceptions
+async def invalidate_cache(
+        request: Request,
+        response: Response,
+        key: Union[str, None] = None
+    ) -> Union[dict, str]:
+    # drops one cached estimate by its key, or all of them if no key is
+    # given; admin only
+    if not is_admin(request):
+        response.status_code = status.HTTP_403_FORBIDDEN
+        return 'forbidden'
+    return {'removed': await result_cache.cache.invalidate(key)}
@@ -5,7 +5,10 @@ by the website"""
 from typing import Optional, Union
 
 # external library imports
-from pydantic import BaseModel
+from pydantic import BaseModel, conint
+
+# internal imports
+import app.settings as settings
 
 
 class CodeSubmissionStringDetails(BaseModel):
@@ -27,3 +30,9 @@ class CodeSubmissions(BaseModel):
     language_id: int
     string_details: Optional[CodeSubmissionStringDetails]
     number_details: Optional[CodeSubmissionNumberDetails]
+    # runs per input size; the number of distinct sizes shrinks accordingly
+    # so that the total number of executions stays the same
+    repetitions: conint(ge=1, le=settings.MAX_REPETITIONS) = 1
+    # time the inputs from within the program, several per execution, where
+    # the language has a timing harness; ignored by the streaming endpoint
+    timing_harness: bool = False
@@ -2,11 +2,105 @@
 import os
 
 MAX_INPUTS = 100    # num inputs to generate
+MAX_STRING_LENGTH = 10_000_000  # cap on the length of generated strings
 FLOAT_ALLOWED_CODES_LIST = ['01', '11']   # is float allowed
 FLOAT_ALLOWED_CODE = '01'
 INT_ALLOWED_CODE = '10'
 STRING_INPUT_CODE = '0'
 COMPILER_BASE_URL = 'http://0.0.0.0:2358'
+SUBMISSION_BATCH_SIZE = 20    # judge0's default max_submission_batch_size
+# execution backends: 'judge0' (an instance per url of COMPILER_URLS, or
+# COMPILER_BASE_URL) and/or 'local' (python subprocesses on this machine)
+EXECUTION_BACKENDS = os.getenv('EXECUTION_BACKENDS', 'judge0').split(',')
+COMPILER_URLS = [i for i in os.getenv('COMPILER_URLS', '').split(',') if i]
+JUDGE0_BACKEND_CAPACITY = int(os.getenv('JUDGE0_BACKEND_CAPACITY', 8))  # concurrent runs
+BACKEND_HEALTH_CHECK_INTERVAL = 15  # seconds
+LOCAL_RUNNER_WORKERS = int(os.getenv('LOCAL_RUNNER_WORKERS', os.cpu_count() or 1))
+LOCAL_RUNNER_TIME_LIMIT = 5.0   # cpu seconds, judge0's default
+LOCAL_RUNNER_MEMORY_LIMIT = 512*1024*1024   # bytes of address space
+LOCAL_RUNNER_FILE_LIMIT = 1024*1024     # bytes a run may write to a file
+LOCAL_RUNNER_STDERR_CHARS = 2000    # end of stderr kept as the error
+LOCAL_RUNNER_LANGUAGE_IDS = [71]    # judge0's python 3 id
+# polling of submission results
+POLL_INITIAL_DELAY = 0.1    # seconds before the first poll
+POLL_BACKOFF_FACTOR = 2
+POLL_MAX_DELAY = 2.0    # seconds
+POLL_JITTER = 0.2   # +/- fraction of the delay
+MAX_POLLS_IN_FLIGHT = 4     # concurrent batch GETs per request
+RESULT_DEADLINE = 30.0  # seconds to wait for all results of a request
+# timing harness
+HARNESS_INPUTS_PER_RUN = 10     # inputs timed within one execution
+# failing code
+CANARY_ENABLED = True   # run the smallest input alone before the others
+EARLY_ABORT_REPEATED_ERRORS = 5     # identical errors to give up after
+SHRUNK_RANGE_MIN_SIZES = 8  # sizes left below a time limit to still fit on
+# shared http client
+HTTP_CONNECTION_LIMIT = int(os.getenv('HTTP_CONNECTION_LIMIT', 100))
+HTTP_CONNECTION_LIMIT_PER_HOST = int(
+    os.getenv('HTTP_CONNECTION_LIMIT_PER_HOST', 32)
+)
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', 30))
+HTTP_DNS_CACHE_TTL = 300    # seconds
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_REQUEST_TIMEOUT = float(os.getenv('HTTP_REQUEST_TIMEOUT', 30))
+# repeated runs of each input
+MAX_REPETITIONS = 10
+RUNTIME_AGGREGATION = 'median'  # 'median' or 'trimmed_mean'
+RUNTIME_TRIM_FRACTION = 0.2     # cut from each end for 'trimmed_mean'
+RUNTIME_RESOLUTION = 0.001  # seconds, resolution of judge0's `time`
+# streamed estimates
+STREAM_WAVE_SIZE = 25   # inputs submitted per wave
+STREAM_MIN_POINTS = 8   # runtimes needed before the first provisional estimate
+STREAM_STABLE_UPDATES = 2   # repeats of the same ranking that end the job early
+STREAM_MIN_FRACTION = 0.5   # share of the inputs that must run before stopping early
+STREAM_RANKED_MODELS = 3    # leading models compared for stability
+# active languages list
+LANGUAGES_REFRESH_INTERVAL = 10*60  # seconds between refreshes
+LANGUAGES_RETRY_INTERVAL = 30   # seconds between retries while the compiler is down
+# admission control in front of the compiler
+SCHEDULER_MAX_EXECUTIONS = int(os.getenv('SCHEDULER_MAX_EXECUTIONS', 300))
+SCHEDULER_MAX_QUEUED_JOBS = 50
+SCHEDULER_MAX_QUEUED_PER_CLIENT = 5
+SCHEDULER_DEFAULT_RETRY_AFTER = 5   # seconds, before any job has finished
+SCHEDULER_SHARED_WAIT = 30.0    # seconds a job granted locally waits for the budget shared by the workers
+SINGLE_FLIGHT_DISCONNECT_CHECK = 1.0    # seconds between checks of a waiting client
+# state shared by the worker processes of one host ($WEB_CONCURRENCY): the
+# execution budget, the estimates in flight and, unless they have paths of
+# their own, the result cache and the job store; per process if unset
+SHARED_STATE_DB_PATH = os.getenv('SHARED_STATE_DB_PATH', None)
+SHARED_STATE_BUSY_TIMEOUT = 5.0     # seconds a write waits for another worker's
+SHARED_STATE_HEARTBEAT = 5.0    # seconds between a worker's heartbeats
+SHARED_STATE_WORKER_TIMEOUT = 30.0  # seconds without a heartbeat before a worker's share is reclaimed
+SHARED_STATE_POLL_INITIAL_DELAY = 0.05  # seconds between checks of the shared budget or a flight
+SHARED_STATE_POLL_MAX_DELAY = 1.0   # seconds
+# pool that runs the model fits off the event loop
+FIT_EXECUTOR = os.getenv('FIT_EXECUTOR', 'process')    # 'process', 'thread' or 'inline'
+FIT_WORKERS = int(os.getenv('FIT_WORKERS', 2))
+FIT_MAX_PENDING = 2*FIT_WORKERS     # fits handed to the pool at once
+LINEAR_SYSTEMS_CACHE_BYTES = 64*1024*1024  # design matrices kept per process, by sizes and weights
+# model selection: 'aic', 'bic' or 'loo' (leave-one-out cross-validation)
+MODEL_SELECTION_CRITERION = 'bic'
+# asynchronous job api
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+JOB_QUEUE_MAX_SIZE = 100
+JOB_TTL = 24*60*60  # seconds a finished job is kept
+JOB_STORE_DB_PATH = os.getenv('JOB_STORE_DB_PATH', SHARED_STATE_DB_PATH)   # in memory if unset
+# seconds between the checks for jobs left unfinished by a worker that went
+# away; with several workers sharing JOB_STORE_DB_PATH, SHARED_STATE_DB_PATH
+# must be set too, or each worker takes the others' jobs when it starts
+JOB_RECOVERY_INTERVAL = 60.0
+# discord notifications
+NOTIFY_QUEUE_SIZE = 100
+NOTIFY_DEDUPE_WINDOW = 60   # seconds identical messages are folded together
+NOTIFY_RATE = 0.5   # messages per second
+NOTIFY_BURST = 5
+# cache of complexity estimates
+RESULT_CACHE_MAX_ENTRIES = 1024
+RESULT_CACHE_TTL = 24*60*60     # seconds
+# key the admin endpoints (/invalidate_cache) expect in x-admin-key; they
+# are disabled if unset
+ADMIN_API_KEY = os.getenv('ADMIN_API_KEY', None)
+RESULT_CACHE_DB_PATH = os.getenv('RESULT_CACHE_DB_PATH', SHARED_STATE_DB_PATH)     # no disk tier if unset
 
 inside_docker = os.getenv('is_dockerised', False)
 if inside_docker:
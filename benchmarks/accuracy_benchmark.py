@@ -0,0 +1,84 @@
+"""classification accuracy and fit time of get_complexity_estimates on
+synthetic runtime curves of every registered complexity class, at several
+noise levels and point counts
+
+run from the repository root with `python -m benchmarks.accuracy_benchmark`
+"""
+# standard library imports
+import time
+from typing import Callable, Dict, List
+
+# external library imports
+import numpy as np
+
+# internal imports
+from app.helpers import complexity_models, estimate_complexity
+
+LOW, HIGH = 1, 10_000
+TRIALS = 20
+POINT_COUNTS = [10, 30, 100]
+NOISE_LEVELS = [0.0, 0.01, 0.05]    # std of the noise relative to the curve's range
+BASELINE = 0.02     # seconds of startup cost in every run
+NUMBER_INPUT = 1    # input_type of number inputs
+
+# growth of each class on u = x/HIGH, scaled to 1 at HIGH
+CURVES: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    'Constant': lambda u: np.zeros_like(u),
+    'Logarithmic': lambda u: np.log(u*HIGH)/np.log(HIGH),
+    'Square root': lambda u: np.sqrt(u),
+    'Linear': lambda u: u,
+    'Quasilinear': lambda u: u*np.log(u*HIGH)/np.log(HIGH),
+    'Log-squared linear': lambda u: u*(np.log(u*HIGH)/np.log(HIGH))**2,
+    'Quadratic': lambda u: u**2,
+    'Cubic': lambda u: u**3,
+    'Exponential': lambda u: (np.exp2(20*u) - 1)/(2**20 - 1),
+}
+
+
+def synthetic_runs(
+    name: str, num_points: int, noise: float, rng: np.random.Generator,
+) -> List[List[float]]:
+    # [size, runtime] pairs like the ones returned by the compiler
+    sizes = np.linspace(LOW, HIGH, num_points).round()
+    runtimes = BASELINE + CURVES[name](sizes/HIGH) + rng.normal(0, noise, num_points)
+    return [[int(size), float(t)] for size, t in zip(sizes, runtimes)]
+
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    missing = set(complexity_models.MODELS) - set(CURVES)
+    if missing:
+        print(f'no synthetic curve for {", ".join(sorted(missing))}')
+    for num_points in POINT_COUNTS:
+        print(f'\n{num_points} points')
+        print(
+            f'{"curve":>20} '
+            + ' '.join(f'{f"acc@{noise}":>10}' for noise in NOISE_LEVELS)
+            + f' {"fit (ms)":>9}  most common miss'
+        )
+        for name in CURVES:
+            accuracies, timings, misses = [], [], {}
+            for noise in NOISE_LEVELS:
+                correct = 0
+                for _ in range(TRIALS):
+                    runs = synthetic_runs(name, num_points, noise, rng)
+                    started = time.perf_counter()
+                    estimates = estimate_complexity.get_complexity_estimates(
+                        runs, NUMBER_INPUT
+                    )
+                    timings.append(time.perf_counter() - started)
+                    guess = estimates['estimated_complexity']
+                    correct += guess == name
+                    if guess != name:
+                        misses[guess] = misses.get(guess, 0) + 1
+                accuracies.append(correct/TRIALS)
+            most_common_miss = max(misses, key=misses.get) if misses else '-'
+            print(
+                f'{name:>20} '
+                + ' '.join(f'{accuracy:>10.0%}' for accuracy in accuracies)
+                + f' {1000*np.mean(timings):>9.2f}  {most_common_miss}'
+            )
+
+
+if __name__ == '__main__':
+    main()
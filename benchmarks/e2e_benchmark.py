@@ -0,0 +1,109 @@
+"""end-to-end throughput and latency of main.estimate_code_complexity under
+concurrent load, against the local fake judge0
+
+run from the repository root with `python -m benchmarks.e2e_benchmark`
+"""
+# standard library imports
+import asyncio
+import time
+from collections import Counter
+from typing import List, Tuple
+
+# external library imports
+import numpy as np
+from fastapi import Request, Response
+
+# internal imports
+from app import main as app_main
+from app.models import website_data
+from benchmarks.fake_judge0 import FakeJudge0, start_fake_judge0
+import app.settings as settings
+
+CONCURRENCY_LEVELS = [1, 4, 16]
+REQUESTS_PER_LEVEL = 16
+QUEUE_LATENCY = 0.1     # seconds a submission stays queued in the fake judge0
+RUN_LATENCY = 0.1   # seconds it then stays processing
+CLIENTS = 4     # distinct clients the requests are spread over
+
+
+async def receive_nothing() -> dict:
+    # the client of a benchmark request never disconnects
+    return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+
+def make_request(client: int) -> Request:
+    return Request({
+        'type': 'http', 'method': 'POST', 'path': '/estimate_complexity',
+        'headers': [(b'x-api-key', f'bench-{client}'.encode())],
+        'client': ('127.0.0.1', 0),
+    }, receive=receive_nothing)
+
+
+def make_data(i: int) -> website_data.CodeSubmissions:
+    # a different program every time, so the result cache never answers
+    return website_data.CodeSubmissions(
+        code=f'print(input())  # {i} {time.time()}',
+        input_type=1,
+        language_id=71,
+        number_details={
+            'numbers_allowed': settings.INT_ALLOWED_CODE,
+            'range_start': 1, 'range_end': 10_000,
+        },
+    )
+
+
+async def timed_request(i: int, slots: asyncio.Semaphore) -> Tuple[float, int]:
+    async with slots:
+        response = Response()
+        started = time.perf_counter()
+        await app_main.estimate_code_complexity(
+            data=make_data(i), request=make_request(i % CLIENTS),
+            response=response,
+        )
+        return time.perf_counter() - started, response.status_code
+
+
+async def run_level(concurrency: int) -> None:
+    slots = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    results: List[Tuple[float, int]] = await asyncio.gather(*(
+        timed_request(i, slots) for i in range(REQUESTS_PER_LEVEL)
+    ))
+    elapsed = time.perf_counter() - started
+    latencies = np.array([latency for latency, _ in results])
+    statuses = Counter(code for _, code in results)
+    print(
+        f'{concurrency:>11} {REQUESTS_PER_LEVEL/elapsed:>8.2f} '
+        f'{np.percentile(latencies, 50):>8.2f} '
+        f'{np.percentile(latencies, 95):>8.2f} '
+        f'{np.percentile(latencies, 99):>8.2f}  {dict(statuses)}'
+    )
+
+
+async def run() -> None:
+    judge0 = FakeJudge0(QUEUE_LATENCY, RUN_LATENCY)
+    runner = await start_fake_judge0(judge0)
+    host, port = runner.addresses[0][:2]
+    settings.COMPILER_BASE_URL = f'http://{host}:{port}'
+    await app_main.startup()
+    try:
+        print(
+            f'{REQUESTS_PER_LEVEL} requests per level, judge0 latency '
+            f'{QUEUE_LATENCY}s queued + {RUN_LATENCY}s processing\n'
+            f'{"concurrency":>11} {"req/s":>8} {"p50 (s)":>8} {"p95 (s)":>8} '
+            f'{"p99 (s)":>8}  statuses'
+        )
+        for concurrency in CONCURRENCY_LEVELS:
+            await run_level(concurrency)
+        print(f'judge0 requests: {judge0.requests}')
+    finally:
+        await app_main.shutdown()
+        await runner.cleanup()
+
+
+def main() -> None:
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""local stand-in for judge0: submissions go through the queued (1) and
+processing (2) states with configurable latency and are then accepted (3),
+with a runtime that grows with the input
+
+run from the repository root with `python -m benchmarks.fake_judge0`, or
+start it in-process with `start_fake_judge0`
+"""
+# standard library imports
+import argparse
+import time
+import uuid
+from typing import Callable, Dict
+
+# external library imports
+from aiohttp import web
+
+QUEUED, PROCESSING, ACCEPTED = 1, 2, 3
+STATUS_DESCRIPTIONS = {
+    QUEUED: 'In Queue', PROCESSING: 'Processing', ACCEPTED: 'Accepted',
+}
+LANGUAGES = [{'id': 71, 'name': 'Python (3.8.1)'}]
+
+
+def linear_runtime(stdin: str) -> float:
+    # numbers cost their value, strings their length
+    try:
+        size = abs(float(stdin))
+    except ValueError:
+        size = len(stdin)
+    return 0.01 + 1e-5*size
+
+
+class FakeJudge0:
+    """in-memory submissions and the judge0 endpoints the app uses"""
+
+    def __init__(
+        self, queue_latency: float = 0.2, run_latency: float = 0.2,
+        runtime: Callable[[str], float] = linear_runtime,
+    ) -> None:
+        self.queue_latency = queue_latency
+        self.run_latency = run_latency
+        self.runtime = runtime
+        self._submissions: Dict[str, dict] = {}
+        self.requests = {'post': 0, 'get': 0}
+
+    def _create(self, submission: dict) -> str:
+        token = str(uuid.uuid4())
+        self._submissions[token] = {
+            'created': time.monotonic(), 'stdin': submission.get('stdin', ''),
+        }
+        return token
+
+    def _view(self, token: str) -> dict:
+        submission = self._submissions[token]
+        age = time.monotonic() - submission['created']
+        if age < self.queue_latency:
+            status_id = QUEUED
+        elif age < self.queue_latency + self.run_latency:
+            status_id = PROCESSING
+        else:
+            status_id = ACCEPTED
+        return {
+            'token': token,
+            'status': {
+                'id': status_id, 'description': STATUS_DESCRIPTIONS[status_id],
+            },
+            'time': str(round(self.runtime(submission['stdin']), 3))
+            if status_id == ACCEPTED else None,
+            'stderr': None,
+            'message': None,
+        }
+
+    async def post_batch(self, request: web.Request) -> web.Response:
+        self.requests['post'] += 1
+        body = await request.json()
+        return web.json_response(
+            [{'token': self._create(i)} for i in body['submissions']],
+            status=201,
+        )
+
+    async def get_batch(self, request: web.Request) -> web.Response:
+        self.requests['get'] += 1
+        tokens = request.query['tokens'].split(',')
+        return web.json_response(
+            {'submissions': [self._view(token) for token in tokens]}
+        )
+
+    async def post_submission(self, request: web.Request) -> web.Response:
+        self.requests['post'] += 1
+        token = self._create(await request.json())
+        return web.json_response({'token': token}, status=201)
+
+    async def get_submission(self, request: web.Request) -> web.Response:
+        self.requests['get'] += 1
+        return web.json_response(self._view(request.match_info['token']))
+
+    async def get_languages(self, request: web.Request) -> web.Response:
+        return web.json_response(LANGUAGES)
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.post('/submissions/batch', self.post_batch),
+            web.get('/submissions/batch', self.get_batch),
+            web.post('/submissions', self.post_submission),
+            web.get('/submissions/{token}', self.get_submission),
+            web.get('/languages', self.get_languages),
+        ])
+        return app
+
+
+async def start_fake_judge0(
+    judge0: FakeJudge0, host: str = '127.0.0.1', port: int = 0,
+) -> web.AppRunner:
+    # serves judge0 in the running loop; port 0 picks a free port, the url
+    # is runner.addresses; stop it with `await runner.cleanup()`
+    runner = web.AppRunner(judge0.make_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2358)
+    parser.add_argument('--queue-latency', type=float, default=0.2)
+    parser.add_argument('--run-latency', type=float, default=0.2)
+    args = parser.parse_args()
+    judge0 = FakeJudge0(args.queue_latency, args.run_latency)
+    web.run_app(judge0.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""compares the batched least-squares fitting engine against the previous
+six sequential curve_fit calls
+
+run from the repository root with `python -m benchmarks.fit_benchmark`
+"""
+# standard library imports
+import time
+from typing import Callable, List
+
+# external library imports
+import numpy as np
+import scipy
+
+# internal imports
+from app.helpers import complexity_models, estimate_complexity, fitting_engine
+
+POINT_COUNTS = [100, 1_000, 10_000]
+REPEATS = 5
+
+
+# the model functions curve_fit was called with
+def constant_model(x: List, a: float) -> np.array:
+    # y = 0(x) + a
+    return np.full(len(x), a, dtype=np.float64)
+
+
+def logarithmic_model(x: List, a: float, b: float) -> np.array:
+    # y = a(logx) + b
+    return (a*np.log(np.asarray(x, dtype=np.float64))) + b
+
+
+def linear_model(x: List, a: float, b: float) -> np.array:
+    # y = a(x) + b
+    return (a*np.asarray(x, dtype=np.float64))+b
+
+
+def quasilinear_model(x: List, a: float, b: float) -> np.array:
+    # y = a(x)(logx) + b
+    x = np.asarray(x, dtype=np.float64)
+    return (a*x*np.log(x)) + b
+
+
+def quadratic_model(x: List, a: float, b: float, c: float) -> np.array:
+    # y = a(x)(x) + b(x) + c
+    x = np.asarray(x, dtype=np.float64)
+    return (a*x*x) + (b*x) + c
+
+
+LINEAR_MODELS = [
+    (constant_model, [0]),
+    (logarithmic_model, [0, 0]),
+    (linear_model, [0, 0]),
+    (quasilinear_model, [0, 0]),
+    (quadratic_model, [0, 0, 0]),
+]
+# the same models in the registry
+LINEAR_MODEL_NAMES = ['Constant', 'Logarithmic', 'Linear', 'Quasilinear', 'Quadratic']
+
+
+def sequential_curve_fit(
+    x_data: List[float], runtime_list: List[float], include_exponential: bool,
+):
+    # the fitting approach used before the batched engine
+    models = list(LINEAR_MODELS)
+    if include_exponential:
+        models.append((complexity_models.exponential_model, [0, 0]))
+    fitted_args = []
+    for model, p0 in models:
+        try:
+            args, _ = scipy.optimize.curve_fit(
+                f=model, method="lm", xdata=x_data, ydata=runtime_list, p0=p0
+            )
+        except RuntimeError:
+            args = [runtime_list[0]]*len(p0)
+        fitted_args.append(args)
+    return fitted_args
+
+
+def batched_fit(
+    x_data: List[float], runtime_list: List[float], include_exponential: bool,
+):
+    # the fitting stages of estimate_complexity.get_complexity_estimates
+    linear_args, _ = fitting_engine.fit_linear_models(
+        x_data, runtime_list, models=[
+            complexity_models.MODELS[name] for name in LINEAR_MODEL_NAMES
+        ],
+    )
+    if not include_exponential:
+        return linear_args, None
+    exponential_args, _ = fitting_engine.fit_nonlinear_model(
+        complexity_models.MODELS['Exponential'], x_data, runtime_list
+    )
+    return linear_args, exponential_args
+
+
+def best_time(func: Callable, *args) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    print(
+        f'{"points":>8} {"models":>12} {"curve_fit (ms)":>16} '
+        f'{"batched (ms)":>14} {"speedup":>9}'
+    )
+    for num_points in POINT_COUNTS:
+        x_data = np.linspace(1, 10*num_points, num_points)
+        runtimes = 1e-4*x_data + rng.normal(0, 0.01, num_points)
+        runtime_list = estimate_complexity.min_max_normalise(runtimes)
+        x_list = x_data.tolist()
+
+        for include_exponential, label in [(False, 'linear only'), (True, 'all six')]:
+            sequential = best_time(
+                sequential_curve_fit, x_list, runtime_list, include_exponential
+            )
+            batched = best_time(
+                batched_fit, x_list, runtime_list, include_exponential
+            )
+            print(
+                f'{num_points:>8} {label:>12} {sequential*1000:>16.2f} '
+                f'{batched*1000:>14.2f} {sequential/batched:>8.1f}x'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""load test of the fitting pool: how late the event loop wakes up other
+requests' polling while many fits are running, with the fits run inline on
+the loop, in a thread pool and in a process pool
+
+run from the repository root with `python -m benchmarks.fitting_load_benchmark`
+"""
+# standard library imports
+import asyncio
+import time
+from typing import List
+
+# external library imports
+import numpy as np
+
+# internal imports
+from app.helpers import estimate_complexity, fitting_pool
+import app.settings as settings
+
+MODES = ['inline', 'thread', 'process']
+CONCURRENT_FITS = 16    # fits started together, like a burst of finished jobs
+ROUNDS = 10
+PROBE_INTERVAL = 0.01   # seconds; stands in for the polling sleeps
+
+
+def synthetic_runtimes(rng: np.random.Generator) -> List[List[float]]:
+    sizes = np.arange(1, settings.MAX_INPUTS + 1)*100
+    runtimes = 0.02 + sizes*np.log(sizes)*1e-7 + rng.normal(0, 0.002, len(sizes))
+    return [[int(size), float(t)] for size, t in zip(sizes, runtimes)]
+
+
+async def probe(lags: List[float], stop: asyncio.Event) -> None:
+    # sleeps repeatedly and records how late each wake-up is
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - started - PROBE_INTERVAL)
+
+
+async def run_mode(mode: str) -> None:
+    settings.FIT_EXECUTOR = mode
+    await fitting_pool.start()
+    rng = np.random.default_rng(0)
+    inputs = [synthetic_runtimes(rng) for _ in range(CONCURRENT_FITS)]
+    lags, stop = [], asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    await asyncio.sleep(5*PROBE_INTERVAL)
+
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        await asyncio.gather(*(
+            fitting_pool.run(estimate_complexity.get_complexity_estimates, i, 1)
+            for i in inputs
+        ))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+    await fitting_pool.stop()
+
+    lags_ms = np.array(lags)*1000
+    print(
+        f'{mode:>8} {np.percentile(lags_ms, 50):>9.2f} '
+        f'{np.percentile(lags_ms, 99):>9.2f} {lags_ms.max():>9.2f} '
+        f'{ROUNDS*CONCURRENT_FITS/elapsed:>8.0f}'
+    )
+
+
+def main() -> None:
+    print(
+        f'{settings.FIT_WORKERS} workers, {CONCURRENT_FITS} concurrent fits, '
+        'lag of the event loop in ms\n'
+        f'{"mode":>8} {"p50 lag":>9} {"p99 lag":>9} {"max lag":>9} {"fits/s":>8}'
+    )
+    for mode in MODES:
+        asyncio.run(run_mode(mode))
+
+
+if __name__ == '__main__':
+    main()
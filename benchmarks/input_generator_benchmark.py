@@ -0,0 +1,72 @@
+"""compares the vectorised, lazy string generator against building every
+character with random.choice
+
+run from the repository root with `python -m benchmarks.input_generator_benchmark`
+"""
+# standard library imports
+import random
+import time
+import tracemalloc
+
+# internal imports
+from app.helpers import input_generator
+from app.models import website_data
+
+MAX_LENGTHS = [10_000, 100_000, 1_000_000]
+NUM_INPUTS = 100
+
+
+def per_character_inputs(str_info, num_inputs):
+    # the generator used before the vectorised one
+    sample_pool = input_generator.get_string_input_sample_pool(
+        str_info.characters_allowed
+    )
+    step = max(1, str_info.max_length // num_inputs)
+    return [
+        ''.join([random.choice(sample_pool) for _ in range(i)])
+        for i in range(1, str_info.max_length, step)
+    ]
+
+
+def measure(make_inputs) -> tuple:
+    # seconds until the first input, total seconds and peak MiB held
+    tracemalloc.start()
+    start = time.perf_counter()
+    inputs = iter(make_inputs())
+    next(inputs)
+    first = time.perf_counter() - start
+    for _ in inputs:
+        pass
+    total = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]/2**20
+    tracemalloc.stop()
+    return first, total, peak
+
+
+def main() -> None:
+    print(
+        f'{"max_length":>10} {"generator":>12} {"first (s)":>10} '
+        f'{"total (s)":>10} {"peak MiB":>9}'
+    )
+    for max_length in MAX_LENGTHS:
+        str_info = website_data.CodeSubmissionStringDetails(
+            characters_allowed='111', max_length=max_length,
+        )
+        generators = [
+            ('per-char', lambda: per_character_inputs(str_info, NUM_INPUTS)),
+            ('lazy numpy', lambda: input_generator.iter_string_inputs(
+                str_info, NUM_INPUTS, seed=0
+            )),
+        ]
+        for label, make_inputs in generators:
+            if label == 'per-char' and max_length > 100_000:
+                continue    # takes minutes
+            first, total, peak = measure(make_inputs)
+            print(
+                f'{max_length:>10} {label:>12} {first:>10.4f} {total:>10.3f} '
+                f'{peak:>9.1f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""throughput of the server run with 1, 2, 4... uvicorn worker processes
+sharing their state, against the local fake judge0 in a process of its own
+
+every worker count gets a fresh shared database; the requests are distinct
+programs so that each one runs the whole pipeline
+
+run from the repository root with `python -m benchmarks.scaling_benchmark`
+"""
+# standard library imports
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import List, Tuple
+
+# external library imports
+import aiohttp
+import numpy as np
+
+# internal imports
+import app.settings as settings
+
+JUDGE0_PORT = 2358
+SERVER_PORT = 8765
+REQUESTS = 64
+CONCURRENCY = 32
+# judge0 answers right away, so that the estimator's own work is measured
+QUEUE_LATENCY = 0.0
+RUN_LATENCY = 0.0
+
+
+def make_payload(i: int) -> dict:
+    return {
+        'code': f'print(input())  # {i} {time.time()}',
+        'input_type': 1,
+        'language_id': 71,
+        'number_details': {
+            'numbers_allowed': settings.INT_ALLOWED_CODE,
+            'range_start': 1, 'range_end': 10_000,
+        },
+    }
+
+
+async def wait_until_up(session: aiohttp.ClientSession, url: str) -> None:
+    for _ in range(600):
+        try:
+            async with session.get(url) as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f'{url} did not come up')
+
+
+async def timed_request(
+    session: aiohttp.ClientSession, i: int, slots: asyncio.Semaphore,
+) -> Tuple[float, int]:
+    async with slots:
+        started = time.perf_counter()
+        async with session.post(
+            f'http://127.0.0.1:{SERVER_PORT}/estimate_complexity',
+            json=make_payload(i), headers={'x-api-key': f'bench-{i}'},
+        ) as response:
+            await response.read()
+        return time.perf_counter() - started, response.status
+
+
+async def run_level(workers: int) -> None:
+    with tempfile.TemporaryDirectory() as state_dir:
+        env = {
+            **os.environ,
+            'WEB_CONCURRENCY': str(workers),
+            'SHARED_STATE_DB_PATH': os.path.join(state_dir, 'state.db'),
+            'COMPILER_URLS': f'http://127.0.0.1:{JUDGE0_PORT}',
+            # fits run in the worker itself, one core per worker
+            'FIT_EXECUTOR': 'inline',
+        }
+        server = subprocess.Popen(
+            [
+                sys.executable, '-m', 'uvicorn', 'app.main:app',
+                '--port', str(SERVER_PORT), '--log-level', 'warning',
+            ],
+            env=env,
+        )
+        try:
+            async with aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=600),
+            ) as session:
+                await wait_until_up(
+                    session, f'http://127.0.0.1:{SERVER_PORT}/healthy'
+                )
+                slots = asyncio.Semaphore(CONCURRENCY)
+                started = time.perf_counter()
+                results: List[Tuple[float, int]] = await asyncio.gather(*(
+                    timed_request(session, i, slots) for i in range(REQUESTS)
+                ))
+                elapsed = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait()
+    latencies = np.array([latency for latency, _ in results])
+    statuses = Counter(code for _, code in results)
+    print(
+        f'{workers:>7} {REQUESTS/elapsed:>8.2f} '
+        f'{np.percentile(latencies, 50):>8.2f} '
+        f'{np.percentile(latencies, 95):>8.2f}  {dict(statuses)}'
+    )
+
+
+async def run(worker_counts: List[int]) -> None:
+    judge0 = subprocess.Popen([
+        sys.executable, '-m', 'benchmarks.fake_judge0',
+        '--port', str(JUDGE0_PORT), '--queue-latency', str(QUEUE_LATENCY),
+        '--run-latency', str(RUN_LATENCY),
+    ])
+    try:
+        print(
+            f'{REQUESTS} requests, {CONCURRENCY} at a time, '
+            f'{os.cpu_count()} cores\n'
+            f'{"workers":>7} {"req/s":>8} {"p50 (s)":>8} {"p95 (s)":>8}'
+            f'  statuses'
+        )
+        for workers in worker_counts:
+            await run_level(workers)
+    finally:
+        judge0.terminate()
+        judge0.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--workers', type=int, nargs='+',
+        default=[2**i for i in range((os.cpu_count() or 1).bit_length())],
+    )
+    args = parser.parse_args()
+    asyncio.run(run(args.workers))
+
+
+if __name__ == '__main__':
+    main()
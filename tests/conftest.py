@@ -0,0 +1,36 @@
+# standard library imports
+from typing import Awaitable, Callable, TypeVar
+import asyncio
+
+# external library imports
+import pytest
+
+# internal imports
+from app.helpers import execution_backends
+import app.settings as settings
+
+T = TypeVar('T')
+
+
+@pytest.fixture
+def run_with_local_backend(
+    monkeypatch: pytest.MonkeyPatch,
+) -> Callable[[Callable[[execution_backends.BackendPool], Awaitable[T]]], T]:
+    # runs an async test against a pool of the local python runner only,
+    # started and stopped around it
+    monkeypatch.setattr(settings, 'EXECUTION_BACKENDS', ['local'])
+    monkeypatch.setattr(settings, 'LOCAL_RUNNER_WORKERS', 4)
+    monkeypatch.setattr(settings, 'POLL_INITIAL_DELAY', 0.05)
+    monkeypatch.setattr(settings, 'POLL_MAX_DELAY', 0.2)
+
+    def run(test: Callable[[execution_backends.BackendPool], Awaitable[T]]) -> T:
+        async def main() -> T:
+            await execution_backends.start()
+            try:
+                return await test(execution_backends.get_pool())
+            finally:
+                await execution_backends.stop()
+
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,121 @@
+# standard library imports
+import asyncio
+
+# external library imports
+import numpy as np
+import pytest
+
+# internal imports
+from app.helpers import code_compiler, sample_store
+import app.settings as settings
+
+
+def test_submit_inputs_keeps_the_runs_of_an_input_together(
+    monkeypatch, run_with_local_backend,
+):
+    monkeypatch.setattr(settings, 'SUBMISSION_BATCH_SIZE', 4)
+    submitted = []
+
+    async def test(pool):
+        submit = pool.submit
+
+        async def record_batch(code, language_id, code_inputs):
+            submitted.append(list(code_inputs))
+            return await submit(code, language_id, code_inputs)
+
+        monkeypatch.setattr(pool, 'submit', record_batch)
+        store = await code_compiler.submit_inputs(
+            'print(input())', 71,
+            code_compiler.repeat_inputs(range(1, 5), 3), input_type=1,
+            repetitions=3,
+        )
+        assert len(store) == 12
+        await code_compiler.collect_submission_results(store.tokens)
+
+    run_with_local_backend(test)
+    assert [len(batch) for batch in submitted] == [3, 3, 3, 3]
+
+
+def test_submit_inputs_releases_its_submissions_when_it_fails(
+    monkeypatch, run_with_local_backend,
+):
+    monkeypatch.setattr(settings, 'SUBMISSION_BATCH_SIZE', 2)
+
+    def inputs():
+        yield from range(1, 6)
+        raise ValueError('generation failed')
+
+    async def test(pool):
+        with pytest.raises(ValueError):
+            await code_compiler.submit_inputs(
+                'import time; time.sleep(30)', 71, inputs(), input_type=1,
+            )
+        backend = pool.backends['local']
+        assert backend.outstanding == 0 and not backend._runs
+
+    run_with_local_backend(test)
+
+
+def test_submit_inputs_releases_its_submissions_when_cancelled(
+    monkeypatch, run_with_local_backend,
+):
+    monkeypatch.setattr(settings, 'SUBMISSION_BATCH_SIZE', 2)
+
+    async def test(pool):
+        submitting = asyncio.ensure_future(code_compiler.submit_inputs(
+            'import time; time.sleep(30)', 71, iter(range(1, 7)),
+            input_type=1,
+        ))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        # cancelled after its first batch was created
+        assert pool.backends['local'].outstanding
+        submitting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await submitting
+        backend = pool.backends['local']
+        assert backend.outstanding == 0 and not backend._runs
+
+    run_with_local_backend(test)
+
+
+def test_repeated_errors_abort_early(monkeypatch, run_with_local_backend):
+    monkeypatch.setattr(settings, 'LOCAL_RUNNER_WORKERS', 1)
+    monkeypatch.setattr(settings, 'EARLY_ABORT_REPEATED_ERRORS', 3)
+
+    async def test(pool):
+        store = await code_compiler.submit_inputs(
+            'raise ValueError("broken")', 71, iter(range(1, 21)),
+            input_type=1,
+        )
+        is_error, errors = await code_compiler.get_runtimes_from_tokens(store)
+        assert is_error
+        assert len(errors) == 1 and 'ValueError: broken' in errors.pop()
+        # the runs that were still waiting were dropped rather than awaited
+        assert store.count(sample_store.PENDING)
+        backend = pool.backends['local']
+        assert backend.outstanding == 0 and not backend._runs
+
+    run_with_local_backend(test)
+
+
+def test_range_shrinks_below_the_time_limit(
+    monkeypatch, run_with_local_backend,
+):
+    monkeypatch.setattr(settings, 'LOCAL_RUNNER_WORKERS', 8)
+    monkeypatch.setattr(settings, 'LOCAL_RUNNER_TIME_LIMIT', 1.0)
+    monkeypatch.setattr(settings, 'SHRUNK_RANGE_MIN_SIZES', 4)
+    code = 'import time\nif int(input()) > 5:\n    time.sleep(30)\n'
+
+    async def test(pool):
+        store = await code_compiler.submit_inputs(
+            code, 71, iter(range(1, 14)), input_type=1,
+        )
+        is_error, (sizes, runtimes) = \
+            await code_compiler.get_runtimes_from_tokens(store)
+        assert not is_error
+        assert sizes.tolist() == [1, 2, 3, 4, 5]
+        assert np.all(runtimes > 0)
+        assert store.count(sample_store.TIME_LIMIT_EXCEEDED) == 8
+
+    run_with_local_backend(test)
@@ -0,0 +1,60 @@
+# standard library imports
+import json
+
+# internal imports
+from app.helpers import (
+    code_compiler, estimate_stream, pipeline, result_cache,
+)
+from app.models import website_data
+import app.settings as settings
+
+
+def parse_events(events):
+    return [
+        (event.split('\n')[0][len('event: '):],
+         json.loads(event.split('\n')[1][len('data: '):]))
+        for event in events
+    ]
+
+
+def test_streamed_result_is_cached_like_a_plain_estimate(
+    monkeypatch, run_with_local_backend,
+):
+    monkeypatch.setattr(settings, 'MAX_INPUTS', 20)
+    monkeypatch.setattr(settings, 'STREAM_WAVE_SIZE', 10)
+    monkeypatch.setattr(settings, 'STREAM_STABLE_UPDATES', 1000)
+    monkeypatch.setattr(result_cache, 'cache', result_cache.ResultCache(10, 60))
+    data = website_data.CodeSubmissions.parse_obj({
+        'code': 'print(input())',
+        'input_type': 1,
+        'language_id': 71,
+        'number_details': {
+            'numbers_allowed': settings.INT_ALLOWED_CODE,
+            'range_start': 1, 'range_end': 1000,
+        },
+    })
+    cache_key = result_cache.make_cache_key(data)
+
+    async def test(pool):
+        events = parse_events([
+            event async for event in estimate_stream.stream_estimates(
+                data, code_compiler.get_input_sizes_for_code(data), cache_key,
+            )
+        ])
+        status_code, body = await pipeline.run_estimation(data)
+        return events, status_code, body, await result_cache.cache.get(cache_key)
+
+    events, status_code, body, cached = run_with_local_backend(test)
+    event, result = events[-1]
+    assert event == 'result' and status_code == 200
+    assert set(cached) == set(body)
+    assert cached == {
+        k: v for k, v in result.items() if k not in ('cache_hit', 'stopped_early')
+    }
+
+
+def test_waves_interleave_the_sizes():
+    waves = estimate_stream.split_into_waves(list(range(100)), 25, 2)
+    assert len(waves) == 8
+    assert sorted(size for wave in waves for size in wave) == list(range(100))
+    assert all(wave[0] < 8 and wave[-1] >= 92 for wave in waves)
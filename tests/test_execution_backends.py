@@ -0,0 +1,164 @@
+# standard library imports
+from typing import Dict, List
+import asyncio
+
+# external library imports
+import pytest
+
+# internal imports
+from app.helpers import code_compiler, execution_backends
+import app.settings as settings
+
+
+def test_submit_and_poll(run_with_local_backend):
+    async def test(pool):
+        tokens = await pool.submit('print(int(input())*2)', 71, ['1', '2'])
+        assert all(tokens)
+        assert pool.backends['local'].outstanding == 2
+        results = await code_compiler.collect_submission_results(tokens)
+        assert set(results) == set(tokens)
+        assert all(
+            ok and status_id == execution_backends.ACCEPTED
+            for ok, _, status_id, _ in results.values()
+        )
+        assert pool.backends['local'].outstanding == 0
+
+    run_with_local_backend(test)
+
+
+def test_runtime_error_is_reported_without_launcher_frames(
+    run_with_local_backend,
+):
+    async def test(pool):
+        tokens = await pool.submit('raise ValueError("broken")', 71, [''])
+        results = await code_compiler.collect_submission_results(tokens)
+        ok, error, status_id, _ = results[tokens[0]]
+        assert not ok and status_id == execution_backends.RUNTIME_ERROR
+        assert error.rstrip().endswith('ValueError: broken')
+        assert 'runpy' not in error and '<string>' not in error
+
+    run_with_local_backend(test)
+
+
+def test_unsupported_language_is_rejected(run_with_local_backend):
+    async def test(pool):
+        assert await pool.submit('print(1)', 54, ['']) == [None]
+
+    run_with_local_backend(test)
+
+
+def test_unknown_tokens_are_not_counted(run_with_local_backend):
+    async def test(pool):
+        results = await pool.get_results(['local:unknown', 'missing:token'])
+        assert {status_id for _, _, status_id, _ in results.values()} == \
+            {execution_backends.INTERNAL_ERROR}
+        assert pool.backends['local'].outstanding == 0
+
+    run_with_local_backend(test)
+
+
+def test_release_kills_unfinished_runs(run_with_local_backend):
+    async def test(pool):
+        tokens = await pool.submit('import time; time.sleep(30)', 71, [''])
+        pool.release(tokens)
+        backend = pool.backends['local']
+        assert backend.outstanding == 0 and not backend._runs
+
+    run_with_local_backend(test)
+
+
+class FailingBackend(execution_backends.LocalPythonBackend):
+    async def get_results(
+        self, tokens: List[str],
+    ) -> Dict[str, execution_backends.Result]:
+        raise execution_backends.BackendError(f'{self.name} is down')
+
+
+def test_failing_backend_keeps_the_others_results(
+    monkeypatch, run_with_local_backend,
+):
+    failing = FailingBackend(
+        'failing', workers=1, time_limit=settings.LOCAL_RUNNER_TIME_LIMIT,
+        memory_limit=settings.LOCAL_RUNNER_MEMORY_LIMIT, language_ids=[71],
+    )
+    create_backends = execution_backends.create_backends
+    monkeypatch.setattr(
+        execution_backends, 'create_backends',
+        lambda: create_backends() + [failing],
+    )
+
+    async def test(pool):
+        working = await pool.submit('print(1)', 71, [''])
+        broken = await failing.create_submissions('print(1)', 71, [''])
+        tokens = working + [
+            f'failing{execution_backends.TOKEN_SEPARATOR}{broken[0]}'
+        ]
+        results = await code_compiler.collect_submission_results(
+            tokens, deadline=asyncio.get_running_loop().time() + 2,
+        )
+        assert set(results) == set(working)
+        assert not failing.healthy
+
+    run_with_local_backend(test)
+
+
+def test_execution_backend_is_abstract():
+    with pytest.raises(TypeError):
+        execution_backends.ExecutionBackend('abstract', 1)
+
+
+def run_with_fake_judge0s(monkeypatch, capacities, test):
+    # runs an async test against a pool of one judge0 backend per capacity,
+    # each served by a fake judge0 of its own
+    from benchmarks import fake_judge0
+    from app.helpers import http_client
+
+    monkeypatch.setattr(settings, 'EXECUTION_BACKENDS', ['judge0'])
+    monkeypatch.setattr(settings, 'SUBMISSION_BATCH_SIZE', 10)
+
+    async def main():
+        runners = [
+            await fake_judge0.start_fake_judge0(fake_judge0.FakeJudge0())
+            for _ in capacities
+        ]
+        monkeypatch.setattr(settings, 'COMPILER_URLS', [
+            'http://{}:{}'.format(*runner.addresses[0]) for runner in runners
+        ])
+        await http_client.start()
+        await execution_backends.start()
+        try:
+            pool = execution_backends.get_pool()
+            for backend, capacity in zip(pool.backends.values(), capacities):
+                backend.capacity = capacity
+            return await test(pool)
+        finally:
+            await execution_backends.stop()
+            await http_client.close()
+            for runner in runners:
+                await runner.cleanup()
+
+    return asyncio.run(main())
+
+
+def test_batches_are_spread_over_the_backends(monkeypatch):
+    async def test(pool):
+        store = await code_compiler.submit_inputs(
+            'print(input())', 71, iter(range(100)), input_type=1,
+        )
+        assert [i.outstanding for i in pool.backends.values()] == [50, 50]
+        assert not any(i.reserved for i in pool.backends.values())
+        await code_compiler.collect_submission_results(store.tokens)
+        assert [i.outstanding for i in pool.backends.values()] == [0, 0]
+
+    run_with_fake_judge0s(monkeypatch, [8, 8], test)
+
+
+def test_batches_go_where_there_is_room(monkeypatch):
+    async def test(pool):
+        store = await code_compiler.submit_inputs(
+            'print(input())', 71, iter(range(40)), input_type=1,
+        )
+        assert [i.outstanding for i in pool.backends.values()] == [10, 30]
+        pool.release(store.tokens)
+
+    run_with_fake_judge0s(monkeypatch, [10, 30], test)
@@ -0,0 +1,88 @@
+# standard library imports
+import asyncio
+import json
+
+# external library imports
+import pytest
+
+# internal imports
+from app.helpers import job_queue, job_store
+from app.models import website_data
+
+DATA = website_data.CodeSubmissions.parse_obj({
+    'code': 'print(input())', 'input_type': 1, 'language_id': 71,
+    'number_details': {
+        'numbers_allowed': 1, 'range_start': 1, 'range_end': 10,
+    },
+})
+
+
+def make_store(kind: str, tmp_path) -> job_store.JobStore:
+    if kind == 'sqlite':
+        return job_store.SqliteJobStore(str(tmp_path/'jobs.db'))
+    return job_store.InMemoryJobStore()
+
+
+async def create_job(
+    store: job_store.JobStore, job_id: str, owner: str,
+) -> None:
+    await store.create(
+        {'id': job_id, 'status': 'running', 'partial_runtimes': [1]},
+        {'data': json.loads(DATA.json()), 'client_id': 'key:a'}, owner,
+    )
+
+
+@pytest.mark.parametrize('kind', ['memory', 'sqlite'])
+def test_only_jobs_of_owners_that_went_away_are_adopted(kind, tmp_path):
+    async def test():
+        store = make_store(kind, tmp_path)
+        await create_job(store, 'live', 'worker-1')
+        for i in range(3):
+            await create_job(store, f'orphan-{i}', 'worker-2')
+        await create_job(store, 'finished', 'worker-2')
+        await store.finish('finished', status='done')
+
+        adopted = await store.adopt_orphans('worker-3', {'worker-1'}, 2)
+        assert len(adopted) == 2
+        assert all(job_id.startswith('orphan') for job_id, _ in adopted)
+        assert adopted[0][1]['client_id'] == 'key:a'
+        # what was adopted belongs to worker-3 now
+        adopted += await store.adopt_orphans(
+            'worker-4', {'worker-1', 'worker-3'}, 10,
+        )
+        assert sorted(job_id for job_id, _ in adopted) == \
+            ['orphan-0', 'orphan-1', 'orphan-2']
+        # the request isn't part of the job shown to clients
+        assert 'data' not in await store.get('orphan-0')
+
+    asyncio.run(test())
+
+
+def test_start_requeues_orphaned_jobs(monkeypatch, tmp_path):
+    store = job_store.SqliteJobStore(str(tmp_path/'jobs.db'))
+    monkeypatch.setattr(job_queue, 'store', store)
+    ran = []
+
+    async def run_job(job_id, data, client_id):
+        ran.append((job_id, data, client_id))
+        return 200, {'estimated_complexity': 'Constant'}
+
+    monkeypatch.setattr(job_queue, 'run_job', run_job)
+
+    async def test():
+        # left running by a worker process that no longer exists
+        await create_job(store, 'orphan', 'gone:1:0')
+        await job_queue.start()
+        try:
+            for _ in range(100):
+                if (await store.get('orphan'))['status'] == 'done':
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await job_queue.stop()
+        job = await store.get('orphan')
+        assert job['status'] == 'done' and job['status_code'] == 200
+        assert await store.adopt_orphans('other', set(), 10) == []
+
+    asyncio.run(test())
+    assert ran == [('orphan', DATA, 'key:a')]
@@ -0,0 +1,50 @@
+# external library imports
+import numpy as np
+import pytest
+
+# internal imports
+from app.helpers import (
+    complexity_models, estimate_complexity, fitting_engine, model_selection,
+)
+
+
+def make_samples(weighted: bool):
+    rng = np.random.default_rng(0)
+    x = np.linspace(1, 100, 30)
+    y = 0.002*x**2 + 0.1*x + 1 + rng.normal(0, 0.5, len(x))
+    weights = rng.uniform(0.5, 2, len(x)) if weighted else None
+    return x, y, weights
+
+
+@pytest.mark.parametrize('weighted', [False, True])
+def test_loo_from_the_hat_matrix_matches_refitting(weighted):
+    x, y, weights = make_samples(weighted)
+    model_args, _ = estimate_complexity.fit_models(x, y, weights)
+    scores = model_selection.score_models(x, y, model_args, weights)
+    w = np.ones_like(y) if weights is None else weights/np.mean(weights)
+
+    names = list(complexity_models.MODELS)
+    for model in fitting_engine.get_linear_models():
+        loo_residuals = []
+        for i in range(len(x)):
+            kept = np.arange(len(x)) != i
+            args, _ = fitting_engine.fit_linear_models(
+                x[kept], y[kept], None if weights is None else weights[kept],
+                [model],
+            )
+            prediction = model.evaluate(x[i:i+1], args[model.name])[0]
+            loo_residuals.append(y[i] - prediction)
+        refitted = np.mean(w*np.square(loo_residuals))
+        assert scores['loo_mse'][names.index(model.name)] == \
+            pytest.approx(refitted, rel=1e-6)
+
+
+def test_criteria_pick_the_generating_model():
+    x, y, _ = make_samples(weighted=False)
+    model_args, _ = estimate_complexity.fit_models(x, y)
+    scores = model_selection.score_models(x, y, model_args)
+    for criterion in ['aic', 'bic', 'loo']:
+        ranking = model_selection.rank_models(scores, criterion)
+        assert ranking[0]['model'] == 'Quadratic'
+        assert ranking[0]['relative_likelihood'] == 1
+        assert sum(i['weight'] for i in ranking) == pytest.approx(1)
@@ -0,0 +1,83 @@
+# standard library imports
+import asyncio
+import time
+
+# internal imports
+from app.helpers import metrics, notifs
+
+
+def record_sent(monkeypatch) -> list:
+    # (seconds since the patch, message) of every message sent
+    sent = []
+    started = time.monotonic()
+
+    async def send_message_on_discord(message: str) -> None:
+        sent.append((time.monotonic() - started, message))
+
+    monkeypatch.setattr(
+        notifs, 'send_message_on_discord', send_message_on_discord
+    )
+    return sent
+
+
+def test_repeats_are_sent_once_with_their_count(monkeypatch):
+    sent = record_sent(monkeypatch)
+
+    async def test():
+        dispatcher = notifs.NotificationDispatcher(
+            max_queued=10, dedupe_window=0.2, rate=100, burst=10,
+        )
+        dispatcher.start()
+        for i in range(5):
+            # the same error, whatever the data below it
+            dispatcher.notify(f'error in `job`\nerror trace: boom\ndata: {i}')
+        dispatcher.notify('another error\nerror trace: other')
+        await asyncio.sleep(0.5)
+        await dispatcher.stop()
+
+    asyncio.run(test())
+    messages = [message for _, message in sent]
+    assert messages == [
+        'error in `job`\nerror trace: boom\ndata: 0',
+        'another error\nerror trace: other',
+        'error in `job`\nerror trace: boom\n(repeated 4 more times in 0.2s)',
+    ]
+
+
+def test_sending_is_rate_limited(monkeypatch):
+    sent = record_sent(monkeypatch)
+
+    async def test():
+        dispatcher = notifs.NotificationDispatcher(
+            max_queued=10, dedupe_window=10, rate=20, burst=2,
+        )
+        dispatcher.start()
+        for i in range(6):
+            dispatcher.notify(f'error {i}')
+        while len(sent) < 6:
+            await asyncio.sleep(0.01)
+        await dispatcher.stop()
+
+    asyncio.run(test())
+    # after the burst, one message every 1/rate seconds
+    assert sent[5][0] - sent[1][0] >= 4/20 - 0.02
+
+
+def test_messages_beyond_the_queue_are_dropped(monkeypatch):
+    sent = record_sent(monkeypatch)
+    dropped = metrics.NOTIFICATIONS_DROPPED._values.get((), 0)
+
+    async def test():
+        dispatcher = notifs.NotificationDispatcher(
+            max_queued=2, dedupe_window=10, rate=100, burst=10,
+        )
+        for i in range(5):
+            # nothing is sent before the sender starts
+            dispatcher.notify(f'error {i}')
+        dispatcher.start()
+        await asyncio.sleep(0.05)
+        await dispatcher.stop()
+
+    asyncio.run(test())
+    assert [message for _, message in sent] == ['error 0', 'error 1']
+    assert metrics.NOTIFICATIONS_DROPPED._values[()] - dropped == 3
@@ -0,0 +1,92 @@
+# standard library imports
+import asyncio
+
+# external library imports
+from fastapi.testclient import TestClient
+
+# internal imports
+from app.helpers import result_cache
+from app.models import website_data
+import app.settings as settings
+
+
+def make_data(**fields) -> website_data.CodeSubmissions:
+    return website_data.CodeSubmissions.parse_obj({
+        'code': 'print(input())',
+        'input_type': 1,
+        'language_id': 71,
+        'number_details': {
+            'numbers_allowed': settings.INT_ALLOWED_CODE,
+            'range_start': 1, 'range_end': 1000,
+        },
+        **fields,
+    })
+
+
+def test_cache_key_covers_what_decides_the_runtimes():
+    key = result_cache.make_cache_key(make_data())
+    assert result_cache.make_cache_key(make_data()) == key
+    for fields in [
+        {'code': 'print(input()*2)'},
+        {'repetitions': 3},
+        {'timing_harness': True},
+        {'number_details': {
+            'numbers_allowed': settings.INT_ALLOWED_CODE,
+            'range_start': 1, 'range_end': 2000,
+        }},
+    ]:
+        assert result_cache.make_cache_key(make_data(**fields)) != key
+
+
+def test_cache_key_leaves_out_the_other_input_type():
+    assert result_cache.make_cache_key(make_data(string_details={
+        'characters_allowed': 'abc', 'max_length': 10,
+    })) == result_cache.make_cache_key(make_data())
+
+
+def test_invalidation_reaches_the_disk_tier(tmp_path):
+    async def test():
+        db_path = str(tmp_path/'cache.db')
+        # worker processes sharing the file keep no copies of their own
+        cache = result_cache.ResultCache(0, ttl=60, db_path=db_path)
+        await cache.set('a', {'estimated_complexity': 'Linear'})
+        await cache.set('b', {'estimated_complexity': 'Constant'})
+        other = result_cache.ResultCache(0, ttl=60, db_path=db_path)
+        assert await other.get('a') == {'estimated_complexity': 'Linear'}
+
+        assert await other.invalidate('a') == 1
+        assert await other.get('a') is None
+        assert await cache.invalidate() == 1
+        assert await cache.get('b') is None
+        assert await other.get('b') is None
+
+    asyncio.run(test())
+
+
+def test_expired_entries_are_missed():
+    async def test():
+        cache = result_cache.ResultCache(10, ttl=0)
+        await cache.set('a', {})
+        assert await cache.get('a') is None
+        assert cache.stats()['evictions'] == 1
+
+    asyncio.run(test())
+
+
+def test_invalidate_cache_requires_the_admin_key(monkeypatch):
+    from app.main import app
+    monkeypatch.setattr(settings, 'ADMIN_API_KEY', 'secret')
+    client = TestClient(app)
+    assert client.post('/invalidate_cache').status_code == 403
+    assert client.post(
+        '/invalidate_cache', headers={'x-admin-key': 'wrong'}
+    ).status_code == 403
+    response = client.post(
+        '/invalidate_cache', headers={'x-admin-key': 'secret'}
+    )
+    assert response.status_code == 200
+
+    monkeypatch.setattr(settings, 'ADMIN_API_KEY', None)
+    assert client.post(
+        '/invalidate_cache', headers={'x-admin-key': ''}
+    ).status_code == 403
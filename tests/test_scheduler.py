@@ -0,0 +1,87 @@
+# standard library imports
+import asyncio
+
+# external library imports
+import pytest
+
+# internal imports
+from app.helpers import scheduler, shared_state
+import app.settings as settings
+
+
+def test_full_client_queue_is_rejected_for_that_client():
+    async def test():
+        execution_scheduler = scheduler.ExecutionScheduler(
+            max_executions=2, max_queued=10, max_queued_per_client=1,
+        )
+        granted = await execution_scheduler.acquire('a', 2)
+        queued = asyncio.ensure_future(execution_scheduler.acquire('a', 1))
+        await asyncio.sleep(0)
+        with pytest.raises(scheduler.SchedulerFullError) as rejected:
+            await execution_scheduler.acquire('a', 1)
+        assert rejected.value.client_id == 'a'
+        assert rejected.value.retry_after >= 1
+        # another client still gets a place in the queue
+        other = asyncio.ensure_future(execution_scheduler.acquire('b', 1))
+        await asyncio.sleep(0)
+        assert not other.done()
+
+        await execution_scheduler.release(granted)
+        assert await queued == 1 and await other == 1
+        stats = await execution_scheduler.stats()
+        assert stats['rejected'] == 1 and stats['executions_in_flight'] == 2
+
+    asyncio.run(test())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def test():
+        execution_scheduler = scheduler.ExecutionScheduler(
+            max_executions=1, max_queued=10, max_queued_per_client=10,
+        )
+        granted = await execution_scheduler.acquire('a', 1)
+        waiting = asyncio.ensure_future(execution_scheduler.acquire('b', 1))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        await execution_scheduler.release(granted)
+        stats = await execution_scheduler.stats()
+        assert stats['queued_jobs'] == 0
+        assert stats['executions_in_flight'] == 0
+
+    asyncio.run(test())
+
+
+def test_wait_for_the_shared_budget_is_bounded(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, 'SCHEDULER_SHARED_WAIT', 0.2)
+    monkeypatch.setattr(settings, 'SHARED_STATE_POLL_MAX_DELAY', 0.05)
+
+    async def test():
+        db_path = str(tmp_path/'shared.db')
+        state = shared_state.SharedState(db_path, max_executions=2)
+        other = shared_state.SharedState(db_path, max_executions=2)
+        await state.start()
+        await other.start()
+        monkeypatch.setattr(shared_state, '_state', state)
+        try:
+            # another worker holds the whole shared budget
+            await other.acquire_executions(2)
+            execution_scheduler = scheduler.ExecutionScheduler(
+                max_executions=2, max_queued=10, max_queued_per_client=10,
+            )
+            with pytest.raises(scheduler.SchedulerFullError) as rejected:
+                await execution_scheduler.acquire('a', 2)
+            assert rejected.value.client_id == 'a'
+            stats = await execution_scheduler.stats()
+            assert stats['executions_in_flight'] == 0
+            assert stats['admitted'] == 0 and stats['rejected'] == 1
+            assert stats['shared']['executions_in_flight'] == 2
+
+            await other.release_executions(2)
+            assert await execution_scheduler.acquire('a', 2) == 2
+        finally:
+            await state.stop()
+            await other.stop()
+
+    asyncio.run(test())
@@ -0,0 +1,136 @@
+# standard library imports
+import asyncio
+import time
+
+# external library imports
+import pytest
+
+# internal imports
+from app.helpers import shared_state
+import app.settings as settings
+
+
+def run_with_states(tmp_path, test, count=2, max_executions=10):
+    # runs an async test against count workers sharing one database
+    async def main():
+        states = [
+            shared_state.SharedState(str(tmp_path/'shared.db'), max_executions)
+            for _ in range(count)
+        ]
+        for state in states:
+            await state.start()
+        try:
+            return await test(*states)
+        finally:
+            for state in states:
+                await state.stop()
+
+    return asyncio.run(main())
+
+
+async def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not await predicate():
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_budget_is_shared_by_the_workers(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, 'SHARED_STATE_POLL_MAX_DELAY', 0.05)
+
+    async def test(state, other):
+        await state.acquire_executions(6)
+        await other.acquire_executions(4)
+        waiting = asyncio.ensure_future(other.acquire_executions(3))
+        await asyncio.sleep(0.1)
+        assert not waiting.done()
+        assert (await state.stats())['executions_in_flight'] == 10
+
+        await state.release_executions(6)
+        await asyncio.wait_for(waiting, 1)
+        assert (await state.stats())['executions_in_flight'] == 7
+
+    run_with_states(tmp_path, test)
+
+
+def test_cancelled_take_gives_its_executions_back(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, 'SHARED_STATE_POLL_MAX_DELAY', 0.05)
+
+    async def test(state, other):
+        await other.acquire_executions(8)
+        waiting = asyncio.ensure_future(state.acquire_executions(5))
+        await asyncio.sleep(0.1)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        await other.release_executions(8)
+        await asyncio.sleep(0.1)
+        assert (await state.stats())['executions_in_flight'] == 0
+
+    run_with_states(tmp_path, test)
+
+
+def test_one_worker_runs_an_estimate_at_a_time(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, 'SHARED_STATE_POLL_MAX_DELAY', 0.05)
+
+    async def test(state, other):
+        assert await state.claim('key')
+        # claiming again from the same worker is allowed
+        assert await state.claim('key')
+        assert not await other.claim('key')
+        assert await other.claim('other key')
+        waiting = asyncio.ensure_future(other.wait_for('key'))
+        await asyncio.sleep(0.1)
+        assert not waiting.done()
+
+        await state.land('key')
+        await asyncio.wait_for(waiting, 1)
+        assert await other.claim('key')
+        assert (await state.stats())['estimates_in_flight'] == 2
+
+    run_with_states(tmp_path, test)
+
+
+def test_stalled_worker_is_reaped(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, 'SHARED_STATE_WORKER_TIMEOUT', 0.5)
+    monkeypatch.setattr(settings, 'SHARED_STATE_HEARTBEAT', 0.1)
+    monkeypatch.setattr(settings, 'SHARED_STATE_POLL_MAX_DELAY', 0.05)
+
+    async def test(state, other):
+        await state.acquire_executions(8)
+        assert await state.claim('key')
+        # the worker stops heartbeating, as if it had crashed
+        state._heartbeat.cancel()
+        assert await other.live_workers() == {state.worker_id, other.worker_id}
+
+        await asyncio.wait_for(other.acquire_executions(5), 2)
+        assert await other.claim('key')
+        assert await other.live_workers() == {other.worker_id}
+        stats = await other.stats()
+        assert stats['workers'] == 1 and stats['executions_in_flight'] == 5
+
+    run_with_states(tmp_path, test)
+
+
+def test_cancelled_claim_is_landed(monkeypatch, tmp_path):
+    async def test(state, other):
+        claim = state._claim
+
+        def slow_claim(key):
+            time.sleep(0.2)
+            return claim(key)
+
+        monkeypatch.setattr(state, '_claim', slow_claim)
+        claiming = asyncio.create_task(state.claim('key'))
+        await asyncio.sleep(0.05)
+        claiming.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await claiming
+        # the claim itself still goes through
+        await asyncio.sleep(0.3)
+        await wait_until(
+            lambda: asyncio.to_thread(lambda: not state._is_claimed('key'))
+        )
+        assert await other.claim('key')
+
+    run_with_states(tmp_path, test)
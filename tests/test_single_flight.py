@@ -0,0 +1,151 @@
+# standard library imports
+import asyncio
+
+# external library imports
+import pytest
+
+# internal imports
+from app.helpers import single_flight
+
+
+def test_identical_calls_run_once():
+    calls = []
+
+    async def estimate():
+        calls.append(None)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def test():
+        flights = single_flight.SingleFlight()
+        results = await asyncio.gather(*(
+            flights.run('key', estimate) for _ in range(3)
+        ))
+        assert results == [1, 1, 1]
+        assert flights.in_flight() == 0
+
+    asyncio.run(test())
+    assert len(calls) == 1
+
+
+def test_call_outlives_a_cancelled_waiter():
+    async def estimate():
+        await asyncio.sleep(0.05)
+        return 'done'
+
+    async def test():
+        flights = single_flight.SingleFlight()
+        first = asyncio.ensure_future(flights.run('key', estimate))
+        second = asyncio.ensure_future(flights.run('key', estimate))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == 'done'
+        assert first.cancelled()
+
+    asyncio.run(test())
+
+
+def test_call_is_cancelled_with_its_last_waiter():
+    async def test():
+        stopped = asyncio.Event()
+
+        async def estimate():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                stopped.set()
+                raise
+
+        flights = single_flight.SingleFlight()
+        waiters = [
+            asyncio.ensure_future(flights.run('key', estimate))
+            for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.wait_for(stopped.wait(), timeout=1)
+        assert flights.in_flight() == 0
+
+    asyncio.run(test())
+
+
+def test_disconnected_waiter_stops_waiting(monkeypatch):
+    monkeypatch.setattr(
+        single_flight.settings, 'SINGLE_FLIGHT_DISCONNECT_CHECK', 0.01
+    )
+
+    async def is_disconnected():
+        return True
+
+    async def test():
+        flights = single_flight.SingleFlight()
+        with pytest.raises(single_flight.ClientDisconnectedError):
+            await flights.run(
+                'key', lambda: asyncio.sleep(10), is_disconnected
+            )
+        assert flights.in_flight() == 0
+
+    asyncio.run(test())
+
+
+class FakeRequest:
+    def __init__(self, api_key: str) -> None:
+        self.headers = {'x-api-key': api_key}
+        self.client = None
+
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+def test_joined_request_retries_under_its_own_client(monkeypatch):
+    from fastapi import Response
+    from app import main
+    from app.helpers import scheduler
+    from app.models import website_data
+
+    async def estimate_and_cache(data, client_id, cache_key):
+        await asyncio.sleep(0.05)
+        async with scheduler.scheduler.admit(client_id, 1):
+            await asyncio.sleep(0.05)
+        return 200, {'client_id': client_id}
+
+    async def no_cached_estimate(key):
+        return None
+
+    monkeypatch.setattr(main, 'estimate_and_cache', estimate_and_cache)
+    monkeypatch.setattr(main.result_cache.cache, 'get', no_cached_estimate)
+    data = website_data.CodeSubmissions.parse_obj({
+        'code': 'print(input())', 'input_type': 1, 'language_id': 71,
+        'number_details': {
+            'numbers_allowed': 1, 'range_start': 1, 'range_end': 10,
+        },
+    })
+
+    async def test():
+        # client a already has as many jobs queued as it may
+        monkeypatch.setattr(
+            scheduler, 'scheduler', scheduler.ExecutionScheduler(1, 10, 1)
+        )
+        granted = await scheduler.scheduler.acquire('key:other', 1)
+        queued = asyncio.ensure_future(scheduler.scheduler.acquire('key:a', 1))
+        await asyncio.sleep(0)
+
+        responses = [Response(), Response()]
+        first = asyncio.ensure_future(
+            main.run_estimate(data, FakeRequest('a'), responses[0])
+        )
+        await asyncio.sleep(0.01)
+        joined = asyncio.ensure_future(
+            main.run_estimate(data, FakeRequest('b'), responses[1])
+        )
+        await asyncio.sleep(0.1)
+        await scheduler.scheduler.release(granted)
+        await scheduler.scheduler.release(await queued)
+
+        assert responses[0].status_code == 429 and 'full' in await first
+        assert await joined == {'client_id': 'key:b', 'cache_hit': False}
+        assert responses[1].status_code == 200
+
+    asyncio.run(test())
@@ -0,0 +1,50 @@
+# external library imports
+import numpy as np
+
+# internal imports
+from app.helpers import code_compiler, sample_store, timing_harness
+import app.settings as settings
+
+
+def test_parse_timings_skips_other_lines():
+    log = '\n'.join([
+        'a warning',
+        f'{timing_harness.MARKER} 0.5',
+        f'{timing_harness.MARKER} not a number',
+        f'{timing_harness.MARKER} 1e-06',
+    ])
+    assert timing_harness.parse_timings(log) == [0.5, 1e-06]
+    assert timing_harness.parse_timings(None) == []
+
+
+def test_harness_timings_that_dont_match_the_inputs_fail_the_run():
+    store = sample_store.SampleStore()
+    store.add_runs('token', [1, 2, 3], harnessed=True)
+    log = f'{timing_harness.MARKER} 0.1\n{timing_harness.MARKER} 0.2\n'
+    assert code_compiler.record_results(
+        store, {'token': (True, 0.5, sample_store.ACCEPTED, log)}
+    ) == []
+    assert store.count(sample_store.ACCEPTED) == 0
+
+
+def test_harness_reports_a_runtime_per_input(
+    monkeypatch, run_with_local_backend,
+):
+    monkeypatch.setattr(settings, 'HARNESS_INPUTS_PER_RUN', 4)
+
+    async def test(pool):
+        store = await code_compiler.submit_inputs(
+            'x = int(input())\nsum(range(x))\nexit()\n', 71,
+            iter([10, 1_000, 100_000, 1_000_000, 10]), input_type=1,
+            harness=True,
+        )
+        # two submissions: four inputs, then one
+        assert len(store.tokens) == 2 and len(store) == 5
+        results = await code_compiler.collect_submission_results(store.tokens)
+        code_compiler.record_results(store, results)
+        sizes, runtimes = store.successful()
+        assert sizes.tolist() == [10, 1_000, 100_000, 1_000_000, 10]
+        assert np.all(runtimes > 0)
+        assert runtimes[3] > runtimes[0]
+
+    run_with_local_backend(test)